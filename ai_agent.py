@@ -2,64 +2,71 @@
 
 import json
 import re
+import uuid
 from datetime import datetime, timedelta
-from groq import Groq
+from async_services import groq_calls
 from config import Config
+from http_pools import pooled_httpx_client
+from context_store import create_context_store, new_context
+from fast_path import FastPathHandler
+from prompt_builder import PromptBuilder
+from response_cache import ResponseCache
 from fastapi import Form
 
 class AIAppointmentAgent:
-    def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
-        self.conversation_context = {}
+    def __init__(self, context_store=None):
+        self._client = None
+        self.context_store = context_store or create_context_store()
+        self.prompt_builder = PromptBuilder()
+        self.fast_path = FastPathHandler()
+        self.response_cache = ResponseCache(max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+                                            ttl_seconds=Config.RESPONSE_CACHE_TTL_SECONDS)
 
-    def process_message(self, user_id, message, available_doctors=None):
+    @property
+    def client(self):
+        # Fast-path and cached turns never reach the LLM, so the Groq SDK loads on the first turn that does
+        if self._client is None:
+            from groq import Groq
+            self._client = Groq(api_key=Config.GROQ_API_KEY, http_client=pooled_httpx_client("groq"))
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    async def process_message(self, user_id, message, available_doctors=None, roster_version=None):
         """Process user message and return appropriate response"""
-        if user_id not in self.conversation_context:
-            self.conversation_context[user_id] = {
-                'stage': 'greeting',
-                'collected_info': {}
-            }
-        context = self.conversation_context[user_id]
+        context = await self.get_context(user_id)
+
+        fast_response = self.fast_path.handle(context, message)
+        if fast_response is not None:
+            await self._apply_turn(user_id, fast_response)
+            return fast_response
+
+        cache_key = self.response_cache.key(
+            context, message, self.prompt_builder.roster(available_doctors, roster_version))
+        if cache_key is not None:
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                await self._apply_turn(user_id, cached_response)
+                return cached_response
 
-        system_prompt = f"""You are a helpful AI assistant for a medical clinic. Your job is to help patients book appointments.
-Available doctors and their specialties:
-{json.dumps([{'name': d.name, 'specialty': d.specialty} for d in available_doctors]) if available_doctors else "[]"}
-Conversation stages:
-1. greeting - Welcome and understand what they need
-2. doctor_selection - Help them choose appropriate doctor
-3. info_collection - Collect patient information (name, email, phone, reason)
-4. scheduling - Show available slots and book appointment
-5. confirmation - Confirm details and provide next steps
-Current stage: {context['stage']}
-Collected info: {json.dumps(context['collected_info'])}
-Guidelines:
-- Be friendly and professional
-- Ask for one piece of information at a time
-- Validate email and phone formats
-- Suggest appointment slots clearly
-- Always confirm details before booking
-Respond in JSON format:
-{{
-    "message": "Your response to the patient",
-    "next_stage": "next_conversation_stage",
-    "extracted_info": {{"key": "value"}},
-    "action_needed": "book_appointment|get_availability|none"
-}}
-"""
+        messages = self.prompt_builder.build_messages(context, message, available_doctors, roster_version)
 
         try:
-            response = self.client.chat.completions.create(
+            response = await groq_calls.call(
+                "chat.completions.create",
+                self.client.chat.completions.create,
                 model="mixtral-8x7b-32768",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ],
+                messages=messages,
                 temperature=0.7,
                 max_tokens=1024
             )
+            self.prompt_builder.record_usage(messages, getattr(response, 'usage', None))
             ai_response = json.loads(response.choices[0].message.content)
-            context['stage'] = ai_response.get('next_stage', context['stage'])
-            context['collected_info'].update(ai_response.get('extracted_info', {}))
+            if cache_key is not None:
+                self.response_cache.put(cache_key, ai_response)
+            await self._apply_turn(user_id, ai_response)
             return ai_response
         except Exception as e:
             return {
@@ -69,6 +76,28 @@ Respond in JSON format:
                 "action_needed": "none"
             }
 
-    def clear_context(self, user_id):
-        if user_id in self.conversation_context:
-            del self.conversation_context[user_id]
\ No newline at end of file
+    async def _apply_turn(self, user_id, ai_response):
+        def apply(current):
+            extracted = ai_response.get('extracted_info') or {}
+            current['stage'] = ai_response.get('next_stage', current['stage'])
+            current['collected_info'].update(extracted)
+            if 'selected_slot' in extracted:
+                # Each slot selection is a new booking attempt; retries of it share this token
+                current['booking_token'] = uuid.uuid4().hex
+            return current
+
+        await self.context_store.update(user_id, apply)
+
+    async def remember_offered_slots(self, user_id, slot_options):
+        """Keep the slots shown to the user so a numbered reply can pick one"""
+        def apply(current):
+            current['offered_slots'] = slot_options
+            return current
+
+        await self.context_store.update(user_id, apply)
+
+    async def get_context(self, user_id):
+        return await self.context_store.get(user_id) or new_context()
+
+    async def clear_context(self, user_id):
+        await self.context_store.delete(user_id)
@@ -0,0 +1,71 @@
+# appointment_read_model.py
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from async_services import run_query
+from supabase_client import supabase
+
+
+def appointment_view(record):
+    """The shape GET /api/appointments/{id} returns"""
+    return {
+        "id": record["id"],
+        "patient_name": (record.get("patient") or {}).get("name"),
+        "doctor_name": (record.get("doctor") or {}).get("name"),
+        "scheduled_datetime": record["scheduled_datetime"],
+        "status": record["status"],
+        "reason": record["reason"]
+    }
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check with weak comparison: ``*``, a list of tags, and ``W/`` prefixes all count"""
+    if not if_none_match or not etag:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in tags)
+
+
+class AppointmentReadModel:
+    """Appointments loaded with their patient and doctor in one embedded select, cached by id.
+
+    Each cached entry carries an ETag of its view so pollers can revalidate
+    with If-None-Match. Writers call ``invalidate`` after changing a row; the
+    short TTL bounds staleness for writes made by other workers. At most
+    ``max_entries`` appointments are kept, least recently read first out.
+    """
+
+    SELECT = "*, patient:patients(*), doctor:doctors(*)"
+
+    def __init__(self, ttl_seconds=30, max_entries=5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, appointment_id, fresh=False):
+        """Return (record, etag), or (None, None) if the appointment does not exist"""
+        entry = self._entries.get(appointment_id)
+        if entry and not fresh and entry[2] > time.monotonic():
+            self._entries.move_to_end(appointment_id)
+            return entry[0], entry[1]
+
+        response = await run_query(supabase.table("appointments").select(self.SELECT).eq("id", appointment_id).limit(1))
+        if not response.data:
+            self._entries.pop(appointment_id, None)
+            return None, None
+        record = response.data[0]
+        etag = self._etag(record)
+        self._entries[appointment_id] = (record, etag, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(appointment_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return record, etag
+
+    def invalidate(self, appointment_id):
+        self._entries.pop(appointment_id, None)
+
+    def _etag(self, record):
+        payload = json.dumps(appointment_view(record), sort_keys=True, default=str)
+        return '"' + hashlib.sha1(payload.encode()).hexdigest() + '"'
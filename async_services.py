@@ -0,0 +1,82 @@
+# async_services.py
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import Config
+from metrics import DEPENDENCY_ERRORS, track
+
+
+class DependencyTimeout(TimeoutError):
+    pass
+
+
+class BlockingDependency:
+    """Runs calls of a blocking client (Groq, Twilio, Supabase) off the event loop.
+
+    Each dependency gets its own bounded thread pool, so a slow provider can
+    only tie up its own threads. A call keeps its slot until the worker thread
+    really finishes, even when the awaiting coroutine has already timed out,
+    which keeps the number of threads talking to a provider at ``max_concurrency``.
+    """
+
+    def __init__(self, name, max_concurrency, timeout_seconds, track_calls=True):
+        self.name = name
+        self.track_calls = track_calls
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(self, fn, *args, **kwargs):
+        return await self.call(getattr(fn, '__qualname__', 'call'), fn, *args, **kwargs)
+
+    async def call(self, operation, fn, *args, **kwargs):
+        """Like ``run`` with an explicit operation name for metrics"""
+        loop = asyncio.get_running_loop()
+        call = partial(fn, *args, **kwargs)
+        if self.track_calls:
+            call = partial(self._timed, operation, call)
+        await self._semaphore.acquire()
+        try:
+            # Copy the context so the request's dependency breakdown sees calls made in the thread
+            future = loop.run_in_executor(self._executor, contextvars.copy_context().run, call)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            DEPENDENCY_ERRORS.labels(self.name, f"{operation} timeout").inc()
+            raise DependencyTimeout(f"{self.name} call timed out after {self.timeout_seconds}s")
+
+    def _timed(self, operation, call):
+        with track(self.name, operation):
+            return call()
+
+    def _release(self, future):
+        self._semaphore.release()
+        # Mark the result as retrieved when the caller has already given up on it
+        if not future.cancelled():
+            future.exception()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+groq_calls = BlockingDependency("groq", Config.GROQ_MAX_CONCURRENCY, Config.GROQ_TIMEOUT_SECONDS)
+twilio_calls = BlockingDependency("twilio", Config.TWILIO_MAX_CONCURRENCY, Config.TWILIO_TIMEOUT_SECONDS)
+supabase_calls = BlockingDependency("supabase", Config.SUPABASE_MAX_CONCURRENCY, Config.SUPABASE_TIMEOUT_SECONDS)
+# GoogleCalendarService times its own freebusy/insert requests, so whole calendar calls are not tracked twice
+calendar_calls = BlockingDependency("calendar", Config.CALENDAR_MAX_CONCURRENCY, Config.CALENDAR_TIMEOUT_SECONDS,
+                                    track_calls=False)
+outbox_calls = BlockingDependency("outbox", Config.OUTBOX_DB_MAX_CONCURRENCY, Config.OUTBOX_DB_TIMEOUT_SECONDS)
+
+
+async def run_query(query):
+    """Execute a Supabase query builder without blocking the event loop"""
+    request = getattr(query, 'request', None)
+    operation = f"{getattr(request, 'http_method', 'GET')} {str(getattr(request, 'path', '')).rsplit('/', 1)[-1]}"
+    return await supabase_calls.call(operation, query.execute)
@@ -0,0 +1,102 @@
+# benchmarks/bench_slots.py
+#
+# Micro-benchmark: original per-slot availability loop vs the sweep-line slot engine.
+# Run from the repository root: python benchmarks/bench_slots.py
+
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slot_engine import (DEFAULT_WORKING_HOURS, build_day_bitmaps, iter_free_slots,
+                         parse_busy_periods, slots_from_bitmap)
+
+
+def legacy_available_slots(busy_periods, working_hours, start_date, end_date, duration_minutes=30):
+    """The loop GoogleCalendarService.get_available_slots used before the slot engine"""
+    available_slots = []
+    current_date = start_date.date()
+    while current_date <= end_date.date():
+        day_name = current_date.strftime('%A').lower()
+        if day_name in working_hours:
+            day_hours = working_hours[day_name]
+            start_time = datetime.combine(current_date,
+                                          datetime.strptime(day_hours['start'], '%H:%M').time())
+            end_time = datetime.combine(current_date,
+                                        datetime.strptime(day_hours['end'], '%H:%M').time())
+
+            current_slot = start_time
+            while current_slot + timedelta(minutes=duration_minutes) <= end_time:
+                slot_end = current_slot + timedelta(minutes=duration_minutes)
+                is_available = True
+                for busy_period in busy_periods:
+                    busy_start = datetime.fromisoformat(busy_period['start'].replace('Z', '+00:00'))
+                    busy_end = datetime.fromisoformat(busy_period['end'].replace('Z', '+00:00'))
+                    if (current_slot < busy_end and slot_end > busy_start):
+                        is_available = False
+                        break
+                if is_available:
+                    available_slots.append(current_slot)
+                current_slot += timedelta(minutes=duration_minutes)
+        current_date += timedelta(days=1)
+    return available_slots
+
+
+def dense_calendar(start_date, days, seed=7):
+    """Busy blocks covering most of each working day, in the naive format the legacy loop can compare"""
+    rng = random.Random(seed)
+    busy = []
+    for offset in range(days):
+        day = (start_date + timedelta(days=offset)).replace(hour=9, minute=0, second=0, microsecond=0)
+        cursor = day
+        while cursor < day.replace(hour=17):
+            length = timedelta(minutes=rng.choice([15, 30, 45, 60]))
+            if rng.random() < 0.85:
+                busy.append({'start': cursor.isoformat(), 'end': (cursor + length).isoformat()})
+            cursor += length
+    rng.shuffle(busy)
+    return busy
+
+
+def engine_slots(busy_periods, start_date, end_date, limit=None):
+    busy = parse_busy_periods(busy_periods)
+    return list(islice(iter_free_slots(busy, DEFAULT_WORKING_HOURS, start_date, end_date), limit))
+
+
+def bitmap_slots(busy_periods, start_date, end_date):
+    busy = parse_busy_periods(busy_periods)
+    slots = []
+    for day_start, bitmap in build_day_bitmaps(busy, DEFAULT_WORKING_HOURS, start_date, end_date).values():
+        slots.extend(slots_from_bitmap(day_start, bitmap))
+    return slots
+
+
+def main():
+    start_date = datetime(2024, 3, 4, 8, 0)
+    end_date = start_date + timedelta(days=14)
+    busy_periods = dense_calendar(start_date, 15)
+
+    expected = legacy_available_slots(busy_periods, DEFAULT_WORKING_HOURS, start_date, end_date)
+    assert engine_slots(busy_periods, start_date, end_date) == expected
+    assert engine_slots(busy_periods, start_date, end_date, limit=10) == expected[:10]
+    assert bitmap_slots(busy_periods, start_date, end_date) == expected
+
+    print(f"{len(busy_periods)} busy periods, {len(expected)} free slots over 14 days")
+    cases = [
+        ("legacy loop (all slots)", lambda: legacy_available_slots(busy_periods, DEFAULT_WORKING_HOURS, start_date, end_date)),
+        ("sweep line (all slots)", lambda: engine_slots(busy_periods, start_date, end_date)),
+        ("sweep line (first 10)", lambda: engine_slots(busy_periods, start_date, end_date, limit=10)),
+        ("day bitmaps (all slots)", lambda: bitmap_slots(busy_periods, start_date, end_date)),
+    ]
+    for name, fn in cases:
+        runs = 20
+        best = min(timeit.repeat(fn, number=runs, repeat=5)) / runs
+        print(f"{name:<26} {best * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
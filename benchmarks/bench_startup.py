@@ -0,0 +1,98 @@
+# benchmarks/bench_startup.py
+#
+# Cold-start benchmark: in a fresh interpreter per run, time importing main, running the
+# startup hook, and serving the first WhatsApp and chat requests. Dependencies are the local
+# fakes from loadtest.py, so no network is needed.
+# Run from the repository root:
+#   python benchmarks/bench_startup.py --runs 5
+#   python benchmarks/bench_startup.py --runs 5 --warm-up     # WARM_UP_SERVICES=all, first request after warm-up
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+sys.path.insert(0, BENCHMARKS)
+
+PHASES = ["import_main", "startup", "warm_up", "first_whatsapp", "first_chat", "second_whatsapp", "to_first_reply"]
+
+
+async def measure(warm_up):
+    """One cold start, run inside a fresh interpreter"""
+    from loadtest import Behaviour, FakeServices, configure_environment
+
+    fakes = FakeServices({name: Behaviour() for name in ("groq", "twilio", "supabase", "calendar")})
+    fakes.seed(doctors=5, appointments=0)
+    fakes.start()
+    configure_environment(fakes, os.path.join(tempfile.mkdtemp(prefix="bench-startup-"), "outbox.sqlite3"))
+    os.environ["GROQ_BASE_URL"] = fakes.base_url
+    if warm_up:
+        os.environ["WARM_UP_SERVICES"] = "all"
+
+    timings = {}
+    began = time.perf_counter()
+    import main
+    timings["import_main"] = time.perf_counter() - began
+
+    started = time.perf_counter()
+    await main.start_services()
+    timings["startup"] = time.perf_counter() - started
+    if getattr(main, "warm_up_task", None):
+        started = time.perf_counter()
+        await main.warm_up_task
+        timings["warm_up"] = time.perf_counter() - started
+
+    import httpx
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://app") as client:
+        for phase, path, payload in (
+            ("first_whatsapp", "/whatsapp", {"data": {"From": "whatsapp:+15550001111", "Body": "hello there"}}),
+            ("first_chat", "/api/chat", {"json": {"user_id": "bench", "message": "hello there"}}),
+            ("second_whatsapp", "/whatsapp", {"data": {"From": "whatsapp:+15550002222", "Body": "good morning"}}),
+        ):
+            started = time.perf_counter()
+            response = await client.post(path, **payload)
+            response.raise_for_status()
+            timings[phase] = time.perf_counter() - started
+    # Without warm-up this is the whole cold start; with it, warm-up would overlap real traffic
+    timings["to_first_reply"] = (timings["import_main"] + timings["startup"] + timings.get("warm_up", 0.0)
+                                 + timings["first_whatsapp"])
+
+    await main.stop_services()
+    fakes.stop()
+    return timings
+
+
+def run_child(warm_up):
+    command = [sys.executable, os.path.abspath(__file__), "--child"] + (["--warm-up"] if warm_up else [])
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true", help="set WARM_UP_SERVICES=all")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.warm_up))))
+        return
+
+    runs = [run_child(args.warm_up) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts{' with warm-up' if args.warm_up else ''} (median / max, ms)")
+    for phase in PHASES:
+        values = [run[phase] * 1000 for run in runs if phase in run]
+        if values:
+            print(f"  {phase:<18}{statistics.median(values):>10.1f}{max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main_cli()
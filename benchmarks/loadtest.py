@@ -0,0 +1,575 @@
+# benchmarks/loadtest.py
+#
+# Offline load test: runs the real FastAPI app from main.py against local stand-ins for
+# Groq, Twilio, Supabase/PostgREST and Google Calendar, each served over HTTP with
+# configurable latency and error rates, so the real SDK clients do real round trips.
+#
+# Run from the repository root:
+#   python benchmarks/loadtest.py --users 200 --concurrency 50 --appointments 5000
+#   python benchmarks/loadtest.py --groq-latency 0.8 --groq-error-rate 0.02 --json
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DOCTOR_NAMES = ["Smith", "Johnson", "Lee", "Garcia", "Patel", "Nguyen", "Brown", "Khan", "Muller", "Rossi"]
+SPECIALTIES = ["Cardiology", "Dermatology", "Pediatrics", "General Practice", "Neurology"]
+
+
+class Behaviour:
+    """Latency and failure profile of one fake dependency"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=500):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class FakeDatabase:
+    """Just enough PostgREST: eq/neq/gt/gte/lt/lte/in/ilike/is filters, order, limit,
+    insert, update and one level of embedded selects like ``patient:patients(*)``"""
+
+    def __init__(self):
+        self.tables = {"doctors": [], "patients": [], "appointments": []}
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def insert(self, table, rows):
+        with self._lock:
+            created = []
+            for row in rows:
+                row = dict(row)
+                if "id" not in row:
+                    self._ids[table] = self._ids.get(table, 0) + 1
+                    row["id"] = self._ids[table]
+                self.tables.setdefault(table, []).append(row)
+                created.append(row)
+            return created
+
+    def select(self, table, params):
+        with self._lock:
+            rows = [row for row in self.tables.get(table, []) if self._matches(row, params)]
+            order = params.get("order")
+            if order:
+                column, _, direction = order.partition(".")
+                rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+            if "offset" in params:
+                rows = rows[int(params["offset"]):]
+            if "limit" in params:
+                rows = rows[:int(params["limit"])]
+            return [self._embed(row, params.get("select", "*")) for row in rows]
+
+    def update(self, table, params, values):
+        with self._lock:
+            updated = []
+            for row in self.tables.get(table, []):
+                if self._matches(row, params):
+                    row.update(values)
+                    updated.append(dict(row))
+            return updated
+
+    def _embed(self, row, select):
+        row = dict(row)
+        for alias, target in re.findall(r'(\w+):(\w+)\(\*\)', select):
+            foreign_key = row.get(f"{alias}_id")
+            row[alias] = next((dict(r) for r in self.tables.get(target, []) if r["id"] == foreign_key), None)
+        return row
+
+    def _matches(self, row, params):
+        for column, expressions in params.items():
+            if column in ("select", "order", "limit", "offset"):
+                continue
+            # A column filtered twice (e.g. a gt/lte range) arrives as a list
+            for expression in expressions if isinstance(expressions, list) else [expressions]:
+                operator, _, value = expression.partition(".")
+                if not self._compare(row.get(column), operator, value):
+                    return False
+        return True
+
+    def _compare(self, actual, operator, value):
+        if operator == "in":
+            return str(actual) in {item.strip('"') for item in value.strip("()").split(",")}
+        if operator == "is":
+            return actual is None if value == "null" else str(actual).lower() == value.lower()
+        if operator == "ilike":
+            pattern = re.escape(value.lower()).replace(r"\*", ".*").replace("%", ".*")
+            return actual is not None and re.fullmatch(pattern, str(actual).lower()) is not None
+        expected = self._coerce(actual, value)
+        if operator == "eq":
+            return actual == expected
+        if operator == "neq":
+            return actual != expected
+        if actual is None:
+            return False
+        return {"gt": actual > expected, "gte": actual >= expected,
+                "lt": actual < expected, "lte": actual <= expected}[operator]
+
+    def _coerce(self, actual, value):
+        if isinstance(actual, bool):
+            return value.lower() == "true"
+        if isinstance(actual, int):
+            return int(value)
+        return value
+
+
+class FakeServices:
+    """One local HTTP server playing Groq, Twilio, PostgREST and Google Calendar"""
+
+    def __init__(self, behaviours, seed=7):
+        self.behaviours = behaviours
+        self.db = FakeDatabase()
+        self.rng = random.Random(seed)
+        self.events = {}
+        self.messages_sent = 0
+        self.calls = {name: 0 for name in behaviours}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _handler_class(self):
+        fakes = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._dispatch()
+
+            def do_POST(self):
+                self._dispatch()
+
+            def do_PATCH(self):
+                self._dispatch()
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                status, payload = fakes.handle(self.command, self.path, self.headers, raw)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def handle(self, method, path, headers, raw):
+        url = urlsplit(path)
+        if url.path.startswith("/openai/"):
+            service = "groq"
+        elif url.path.startswith("/2010-04-01/"):
+            service = "twilio"
+        elif url.path.startswith("/rest/v1/"):
+            service = "supabase"
+        else:
+            service = "calendar"
+        behaviour = self.behaviours[service]
+        with self._lock:
+            self.calls[service] += 1
+        behaviour.delay()
+        if behaviour.should_fail():
+            return behaviour.error_status, {"message": f"injected {service} failure", "code": behaviour.error_status}
+
+        if service == "groq":
+            return 200, self._chat_completion(json.loads(raw))
+        if service == "twilio":
+            with self._lock:
+                self.messages_sent += 1
+            return 201, {"sid": "SM" + uuid.uuid4().hex, "status": "queued"}
+        if service == "supabase":
+            return self._postgrest(method, url, headers, raw)
+        return self._calendar(method, url, raw)
+
+    def _postgrest(self, method, url, headers, raw):
+        table = url.path.rsplit("/", 1)[-1]
+        params = {}
+        for key, value in parse_qsl(url.query, keep_blank_values=True):
+            if key in params:
+                params[key] = (params[key] if isinstance(params[key], list) else [params[key]]) + [unquote(value)]
+            else:
+                params[key] = unquote(value)
+        if method == "POST":
+            body = json.loads(raw)
+            rows = self.db.insert(table, body if isinstance(body, list) else [body])
+        elif method == "PATCH":
+            rows = self.db.update(table, params, json.loads(raw))
+        else:
+            rows = self.db.select(table, params)
+        if "vnd.pgrst.object" in (headers.get("Accept") or ""):
+            if len(rows) != 1:
+                return 406, {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned"}
+            return 200, rows[0]
+        return (201 if method == "POST" else 200), rows
+
+    def _calendar(self, method, url, raw):
+        body = json.loads(raw) if raw else {}
+        if url.path.endswith("/freeBusy"):
+            return 200, {"kind": "calendar#freeBusy", "calendars": {
+                item["id"]: {"busy": self._busy(item["id"], body["timeMin"], body["timeMax"])}
+                for item in body["items"]
+            }}
+        if method == "GET":
+            event = self.events.get(url.path.rsplit("/", 1)[-1])
+            if event is None:
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            return 200, {**event, "status": "confirmed"}
+        event_id = body.get("id") or uuid.uuid4().hex
+        with self._lock:
+            if event_id in self.events:
+                return 409, {"error": {"code": 409, "message": "The requested identifier already exists."}}
+            self.events[event_id] = body
+        return 200, {**body, "id": event_id, "status": "confirmed"}
+
+    def _busy(self, calendar_id, time_min, time_max):
+        """Dense, deterministic busy blocks per calendar: roughly 70% of working hours booked.
+
+        Each day is seeded on its own, so any query window sees the same blocks for that day.
+        """
+        start = datetime.fromisoformat(time_min.replace("Z", "")).replace(hour=9, minute=0, second=0, microsecond=0)
+        end = datetime.fromisoformat(time_max.replace("Z", ""))
+        busy = []
+        day = start
+        while day < end:
+            rng = random.Random(f"{calendar_id}|{day.date()}")
+            cursor = day
+            while cursor < day.replace(hour=17):
+                length = timedelta(minutes=rng.choice([30, 60, 90]))
+                if rng.random() < 0.7:
+                    busy.append({"start": cursor.isoformat() + "Z", "end": (cursor + length).isoformat() + "Z"})
+                cursor += length + timedelta(minutes=30)
+            day += timedelta(days=1)
+        return busy
+
+    def _chat_completion(self, request):
+        """Scripted agent: reads the stage from the prompt and answers the booking conversation"""
+        prompt = "\n".join(m["content"] for m in request["messages"] if m["role"] == "system")
+        message = request["messages"][-1]["content"]
+        stage = re.search(r"Stage: (\w+)", prompt).group(1)
+        lowered = message.lower()
+        reply = {"message": "How can I help you today?", "next_stage": stage, "extracted_info": {},
+                 "action_needed": "none"}
+        if "dr." in lowered:
+            reply.update(message="Great choice. What's your full name?", next_stage="info_collection",
+                         extracted_info={"doctor_name": message.split("Dr.", 1)[1].strip()})
+        elif lowered.startswith("my name is"):
+            reply.update(message="Thanks! What's your email address?", next_stage="info_collection",
+                         extracted_info={"name": message[len("my name is"):].strip()})
+        elif lowered.startswith("reason:"):
+            reply.update(message="Here are the next available times.", next_stage="scheduling",
+                         extracted_info={"reason": message.split(":", 1)[1].strip()},
+                         action_needed="get_availability")
+        elif stage == "greeting":
+            reply.update(message="Hello! Which doctor would you like to see?", next_stage="doctor_selection")
+        content = json.dumps(reply)
+        return {
+            "id": "chatcmpl-" + uuid.uuid4().hex, "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4}
+        }
+
+    def seed(self, doctors, appointments):
+        self.db.insert("doctors", [{
+            "name": f"Dr. {DOCTOR_NAMES[i % len(DOCTOR_NAMES)]}{'' if i < len(DOCTOR_NAMES) else i}",
+            "specialty": SPECIALTIES[i % len(SPECIALTIES)],
+            "email": f"doctor{i}@clinic.test",
+            "google_calendar_id": f"doctor{i}@clinic.test",
+            "working_hours": None
+        } for i in range(doctors)])
+        patients = self.db.insert("patients", [{
+            "name": f"Seed Patient {i}", "email": f"seed{i}@example.test", "phone": f"+1555{i:07d}",
+            "preferred_communication": "sms"
+        } for i in range(max(1, appointments // 4))])
+        now = datetime.utcnow()
+        rows = []
+        for i in range(appointments):
+            due_for_reminder = i % 2 == 0
+            scheduled = (now + timedelta(hours=24, minutes=self.rng.randint(-29, 29)) if due_for_reminder
+                         else now - timedelta(minutes=self.rng.randint(1, 110)))
+            rows.append({
+                "patient_id": patients[i % len(patients)]["id"], "doctor_id": 1 + i % doctors,
+                "scheduled_datetime": scheduled.isoformat(), "duration_minutes": 30, "reason": "seed",
+                "appointment_type": "consultation", "status": "scheduled" if due_for_reminder else "completed",
+                "form_sent": False, "reminders_sent": [], "google_calendar_event_id": None
+            })
+        self.db.insert("appointments", rows)
+
+
+def configure_environment(fakes, outbox_path):
+    """Point every client at the fakes; must run before main is imported"""
+    os.environ.update({
+        "SUPABASE_URL": fakes.base_url,
+        "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.loadtest",
+        "GROQ_API_KEY": "loadtest",
+        "GROQ_BASE_URL": fakes.base_url,
+        "TWILIO_ACCOUNT_SID": "AC" + "0" * 32,
+        "TWILIO_AUTH_TOKEN": "loadtest",
+        "TWILIO_PHONE_NUMBER": "+15550000000",
+        "TWILIO_WHATSAPP_NUMBER": "+15550000001",
+        "TWILIO_SMS_MESSAGES_PER_SECOND": "1000",
+        "TWILIO_WHATSAPP_MESSAGES_PER_SECOND": "1000",
+        "OUTBOX_PATH": outbox_path,
+        "SLOW_REQUEST_SECONDS": "3600",
+        # Scheduler jobs are driven and timed explicitly by run_scheduler_jobs
+        "RUN_SCHEDULER": "false",
+    })
+    os.environ.pop("REDIS_URL", None)
+    os.environ.pop("WHATSAPP_FAST_ACK", None)
+
+
+def wire_clients(main, fakes):
+    """Swap SDK endpoints that cannot be set through the environment"""
+    from twilio.http.http_client import TwilioHttpClient
+    from twilio.rest import Client
+    from http_pools import pooled_session
+
+    class LocalTwilioHttpClient(TwilioHttpClient):
+        def request(self, method, url, *args, **kwargs):
+            return super().request(method, url.replace("https://api.twilio.com", fakes.base_url), *args, **kwargs)
+
+    http_client = LocalTwilioHttpClient()
+    http_client.session = pooled_session("twilio")
+    main.notification_service.twilio_client = Client(os.environ["TWILIO_ACCOUNT_SID"], "loadtest",
+                                                     http_client=http_client)
+    main.calendar_service.client_pool.api_endpoint = fakes.base_url + "/calendar/v3/"
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, name, seconds, ok=True):
+        self.samples.setdefault(name, []).append(seconds)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, wall_seconds):
+        report = {}
+        for name, samples in sorted(self.samples.items()):
+            report[name] = {
+                "count": len(samples),
+                "errors": self.errors.get(name, 0),
+                "throughput_per_s": round(len(samples) / wall_seconds, 1) if wall_seconds else 0.0,
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 2)
+            }
+        return report
+
+
+def booking_script(user_number, doctor_name):
+    """Multi-turn /api/chat conversation that ends in a booking"""
+    return [
+        "Hi, I need an appointment",
+        f"I would like to see Dr. {doctor_name}",
+        f"My name is Load Test {user_number}",
+        f"loadtest{user_number}@example.test",
+        f"+1 555 {user_number:07d}",
+        "Reason: annual checkup",
+        "1",
+        "CONFIRM",
+    ]
+
+
+async def run_conversations(client, recorder, users, concurrency, doctor_names, whatsapp_turns):
+    semaphore = asyncio.Semaphore(concurrency)
+    booked = 0
+
+    async def chat_user(number):
+        nonlocal booked
+        async with semaphore:
+            user_id = f"loadtest-{number}"
+            for text in booking_script(number, doctor_names[number % len(doctor_names)]):
+                started = time.perf_counter()
+                response = await client.post("/api/chat", json={"user_id": user_id, "message": text})
+                ok = response.status_code == 200 and response.json().get("booking_success", True) is not False
+                recorder.record("POST /api/chat", time.perf_counter() - started, ok)
+                if response.status_code == 200 and response.json().get("booking_success"):
+                    booked += 1
+
+    async def whatsapp_user(number):
+        async with semaphore:
+            for turn in range(whatsapp_turns):
+                started = time.perf_counter()
+                response = await client.post("/whatsapp", data={
+                    "From": f"whatsapp:+1666{number:07d}",
+                    "Body": ["hi", "hello", f"I would like to see Dr. {doctor_names[0]}"][turn % 3],
+                    "MessageSid": f"SM{number:06d}{turn:04d}"
+                })
+                recorder.record("POST /whatsapp", time.perf_counter() - started, response.status_code == 200)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat_user(i) for i in range(users)), *(whatsapp_user(i) for i in range(users)))
+    return time.perf_counter() - started, booked
+
+
+async def run_scheduler_jobs(main, fakes, recorder, runs):
+    from scheduler import AppointmentScheduler
+
+    results = {}
+
+    async def send_reminders(scheduler):
+        await scheduler.reminders.refill()
+        return await scheduler.send_reminders()
+
+    for job_name, job in (("send_reminders", send_reminders),
+                          ("send_post_appointment_forms", AppointmentScheduler.send_post_appointment_forms)):
+        for _ in range(runs):
+            for row in fakes.db.tables["appointments"]:
+                row["form_sent"] = False
+                row["reminders_sent"] = []
+            # A fresh scheduler per run, so every run loads its reminder horizon from scratch
+            scheduler = AppointmentScheduler(main.notification_service)
+            started = time.perf_counter()
+            summary = await job(scheduler)
+            recorder.record(f"job {job_name}", time.perf_counter() - started, summary.failed == 0)
+            results[job_name] = summary.as_dict()
+    return results
+
+
+async def drain_outbox(outbox, timeout):
+    """Wait for queued messages to reach the fake Twilio; returns the seconds it took"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        stats = outbox.stats()
+        if not stats.get("pending") and not stats.get("sending") and not stats["in_flight"]:
+            break
+        await asyncio.sleep(0.05)
+    return round(time.perf_counter() - started, 3)
+
+
+async def main_async(args):
+    behaviours = {
+        "groq": Behaviour(args.groq_latency, args.groq_latency * args.jitter, args.groq_error_rate),
+        "twilio": Behaviour(args.twilio_latency, args.twilio_latency * args.jitter, args.twilio_error_rate, 429),
+        "supabase": Behaviour(args.supabase_latency, args.supabase_latency * args.jitter, args.supabase_error_rate),
+        "calendar": Behaviour(args.calendar_latency, args.calendar_latency * args.jitter, args.calendar_error_rate),
+    }
+    fakes = FakeServices(behaviours, seed=args.seed)
+    fakes.seed(args.doctors, args.appointments)
+    fakes.start()
+
+    outbox_dir = tempfile.mkdtemp(prefix="loadtest-outbox-")
+    configure_environment(fakes, os.path.join(outbox_dir, "outbox.sqlite3"))
+    import httpx
+    import main
+
+    wire_clients(main, fakes)
+    await main.start_services()
+    recorder = Recorder()
+    doctor_names = [d["name"].replace("Dr. ", "") for d in fakes.db.tables["doctors"]]
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://app",
+                                     timeout=120) as client:
+            wall, booked = await run_conversations(client, recorder, args.users, args.concurrency,
+                                                   doctor_names, args.whatsapp_turns)
+        jobs = await run_scheduler_jobs(main, fakes, recorder, args.job_runs)
+        await main.inbound_dispatcher.drain()
+        outbox_drain = await drain_outbox(main.notification_service.outbox, args.drain_timeout)
+        outbox = main.notification_service.outbox.stats()
+    finally:
+        await main.stop_services()
+        fakes.stop()
+
+    report = {
+        "config": vars(args),
+        "conversation_wall_seconds": round(wall, 3),
+        "bookings": booked,
+        "endpoints": recorder.summary(wall),
+        "jobs": jobs,
+        "fake_calls": fakes.calls,
+        "outbox": outbox,
+        "outbox_drain_seconds": outbox_drain,
+        "agent": {"fast_path": main.ai_agent.fast_path.stats(), "response_cache": main.ai_agent.response_cache.stats(),
+                  "prompt": main.ai_agent.prompt_builder.stats()},
+        "freebusy_cache": main.calendar_service.freebusy_cache.stats(),
+        "http": main.connection_stats.stats(),
+    }
+    return report
+
+
+def print_report(report):
+    print(f"Conversations: {report['config']['users']} chat + {report['config']['users']} WhatsApp users, "
+          f"{report['bookings']} bookings in {report['conversation_wall_seconds']}s")
+    print(f"{'endpoint / job':<36}{'count':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in report["endpoints"].items():
+        print(f"{name:<36}{stats['count']:>8}{stats['errors']:>8}{stats['throughput_per_s']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    for job, summary in report["jobs"].items():
+        print(f"last {job} run: {summary}")
+    print(f"fake dependency calls: {report['fake_calls']}")
+    print(f"outbox: {report['outbox']} (drained in {report['outbox_drain_seconds']}s)")
+    print(f"connection reuse: {report['http']}")
+    print(f"fast path: {report['agent']['fast_path']['hit_rate']:.0%} hits, "
+          f"response cache: {report['agent']['response_cache']['hit_rate']:.0%} hits, "
+          f"freebusy cache: {report['freebusy_cache']['hit_rate']:.0%} hits")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100, help="simulated users per endpoint")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--whatsapp-turns", type=int, default=3)
+    parser.add_argument("--doctors", type=int, default=10)
+    parser.add_argument("--appointments", type=int, default=2000, help="seeded appointments for scheduler jobs")
+    parser.add_argument("--job-runs", type=int, default=5)
+    parser.add_argument("--jitter", type=float, default=0.3, help="latency jitter as a fraction of the latency")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--drain-timeout", type=float, default=60, help="seconds to wait for the outbox to empty")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    for name, latency in (("groq", 0.4), ("twilio", 0.08), ("supabase", 0.02), ("calendar", 0.12)):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency, help=f"seconds per {name} call")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    random.seed(arguments.seed)
+    result = asyncio.run(main_async(arguments))
+    if arguments.json:
+        print(json.dumps(result, indent=2, default=str))
+    else:
+        print_report(result)
@@ -0,0 +1,234 @@
+# booking.py
+
+import asyncio
+import base64
+import hashlib
+import time
+import uuid
+from datetime import datetime
+from async_services import calendar_calls, run_query
+from config import Config
+from reminders import parse_utc
+from supabase_client import supabase
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def slot_key(doctor_id, slot):
+    return f"{doctor_id}:{slot}"
+
+
+class LocalSlotHoldStore:
+    """Slot holds for a single process"""
+
+    # Expired holds are swept at most this often, so the table only holds live offers
+    PURGE_INTERVAL_SECONDS = 60
+
+    def __init__(self):
+        self._holds = {}
+        self._lock = asyncio.Lock()
+        self._next_purge = 0.0
+
+    async def hold(self, key, owner, ttl_seconds):
+        """Take or extend a hold; False if someone else holds the slot"""
+        async with self._lock:
+            now = time.monotonic()
+            if now >= self._next_purge:
+                self._holds = {k: v for k, v in self._holds.items() if v[1] > now}
+                self._next_purge = now + self.PURGE_INTERVAL_SECONDS
+            current = self._holds.get(key)
+            if current and current[1] > now and current[0] != owner:
+                return False
+            self._holds[key] = (owner, now + ttl_seconds)
+            return True
+
+    async def release(self, key, owner):
+        async with self._lock:
+            current = self._holds.get(key)
+            if current and current[0] == owner:
+                del self._holds[key]
+
+
+class RedisSlotHoldStore:
+    """Slot holds shared by every worker through Redis keys with a TTL"""
+
+    # Only the owner may extend or delete its hold
+    _EXTEND = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, client=None, url=None, prefix='slot_hold:'):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    async def hold(self, key, owner, ttl_seconds):
+        key = self.prefix + key
+        ttl_ms = int(ttl_seconds * 1000)
+        if await self.client.set(key, owner, nx=True, px=ttl_ms):
+            return True
+        return bool(await self.client.eval(self._EXTEND, 1, key, owner, ttl_ms))
+
+    async def release(self, key, owner):
+        await self.client.eval(self._RELEASE, 1, self.prefix + key, owner)
+
+
+def create_slot_hold_store():
+    if Config.REDIS_URL:
+        return RedisSlotHoldStore(url=Config.REDIS_URL)
+    return LocalSlotHoldStore()
+
+
+def calendar_event_id(doctor, patient, slot, booking_token):
+    """Deterministic Calendar event id (base32hex, as the API requires) so a retried insert cannot duplicate.
+
+    ``booking_token`` is minted when the patient selects a slot, so a retry of
+    that attempt maps to the same event while a later booking of the same
+    slot (say, after the first appointment was moved away) gets a new one.
+    """
+    digest = hashlib.sha1(f"{doctor['id']}|{patient['id']}|{slot}|{booking_token}".encode()).digest()
+    return base64.b32hexencode(digest).decode().lower().rstrip('=')
+
+
+class BookingPipeline:
+    """Offers slots under short-lived holds and books them idempotently.
+
+    Offered slots are held for the user, so two patients are never shown the
+    same free slot at once. Booking re-checks the hold, runs the independent
+    patient and doctor lookups concurrently, reads the doctor's calendar fresh
+    right before inserting the event, and uses deterministic ids so a retry
+    of the same attempt reuses the calendar event and appointment row it
+    already created. Once booked, the other slots offered to the user are
+    given back.
+    """
+
+    def __init__(self, calendar_service, notification_service, doctor_directory, hold_store=None,
+                 hold_ttl_seconds=None):
+        self.calendar_service = calendar_service
+        self.notification_service = notification_service
+        self.doctor_directory = doctor_directory
+        self.hold_store = hold_store or create_slot_hold_store()
+        self.hold_ttl_seconds = hold_ttl_seconds or Config.SLOT_HOLD_TTL_SECONDS
+        self._booking_locks = {}
+
+    async def offer(self, user_id, doctor, start_date, end_date, limit=10, previous_offer=None):
+        """Return up to ``limit`` slot options, each held for ``user_id``"""
+        if previous_offer:
+            await self.release(user_id, previous_offer)
+        offered = []
+        tried = 0
+        fetch = limit * 2
+        while len(offered) < limit:
+            # Free/busy is cached, so widening the search when others hold the first slots is cheap
+            candidates = await calendar_calls.run(
+                self.calendar_service.get_available_slots, doctor, start_date, end_date, limit=fetch)
+            options = [{"datetime": s.isoformat(), "display": s.strftime("%A, %B %d at %I:%M %p"),
+                        "doctor_id": doctor["id"]} for s in candidates[tried:]]
+            held = await asyncio.gather(*(
+                self.hold_store.hold(slot_key(doctor["id"], option["datetime"]), user_id, self.hold_ttl_seconds)
+                for option in options
+            ))
+            offered.extend(option for option, ok in zip(options, held) if ok)
+            tried = len(candidates)
+            if len(candidates) < fetch:
+                break
+            fetch *= 2
+        # Give back holds on the spare candidates we will not show
+        await self.release(user_id, offered[limit:])
+        return offered[:limit]
+
+    async def release(self, user_id, options):
+        await asyncio.gather(*(
+            self.hold_store.release(slot_key(option['doctor_id'], option['datetime']), user_id)
+            for option in options if option.get('doctor_id') is not None
+        ))
+
+    async def book(self, user_id, collected_info, booking_token=None, offered=None):
+        """Book the selected slot; returns (appointment, patient, doctor)
+
+        ``booking_token`` identifies this booking attempt (see ``calendar_event_id``); without one
+        the booking still works but a retry is not recognised. ``offered`` are the slots shown to
+        the user, whose holds are released once the booking succeeds.
+        """
+        patient, doctor = await asyncio.gather(
+            self._find_or_create_patient(collected_info),
+            self.doctor_directory.find_by_name(collected_info['doctor_name'])
+        )
+        if doctor is None:
+            raise ValueError(f"No doctor matching {collected_info['doctor_name']!r}")
+
+        appointment_datetime = datetime.fromisoformat(collected_info['selected_slot'])
+        key = slot_key(doctor['id'], appointment_datetime.isoformat())
+        if not await self.hold_store.hold(key, user_id, self.hold_ttl_seconds):
+            raise SlotUnavailable(f"{collected_info['selected_slot']} is held by another patient")
+
+        event_id = calendar_event_id(doctor, patient, appointment_datetime.isoformat(),
+                                     booking_token or uuid.uuid4().hex)
+        # Serialize concurrent retries of the same booking within this worker
+        entry = self._booking_locks.setdefault(event_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                appointment = await self._commit(event_id, doctor, patient, appointment_datetime, collected_info)
+        except Exception:
+            await self.hold_store.release(key, user_id)
+            raise
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._booking_locks[event_id]
+        # Keep the slot blocked until every worker's cached free/busy view has caught up
+        await self.hold_store.hold(key, user_id, max(self.hold_ttl_seconds, Config.FREEBUSY_CACHE_TTL_SECONDS))
+        await self.release(user_id, [option for option in offered or []
+                                     if slot_key(option.get('doctor_id'), option.get('datetime')) != key])
+
+        await self.notification_service.send_appointment_confirmation(appointment, patient, doctor)
+        return appointment, patient, doctor
+
+    async def _commit(self, event_id, doctor, patient, appointment_datetime, collected_info):
+        existing = await run_query(supabase.table("appointments").select("*").eq(
+            "google_calendar_event_id", event_id).limit(1))
+        if existing.data:
+            appointment = existing.data[0]
+            # Only an unchanged row is this attempt's result; one since moved or cancelled must not be reported as booked
+            if (appointment['doctor_id'] == doctor['id'] and appointment['status'] in ('scheduled', 'confirmed')
+                    and parse_utc(appointment['scheduled_datetime']) == parse_utc(appointment_datetime)):
+                return appointment
+            raise SlotUnavailable(f"Booking {event_id} was already used for an appointment that has since changed")
+
+        duration = collected_info.get('duration', 30)
+        # Holds only cover offers made by this app; the calendar itself may have been booked meanwhile
+        if not await calendar_calls.run(self.calendar_service.is_slot_free, doctor, appointment_datetime, duration,
+                                        event_id=event_id):
+            raise SlotUnavailable(f"{appointment_datetime.isoformat()} is no longer free in the doctor's calendar")
+        await calendar_calls.run(self.calendar_service.create_appointment, doctor, patient, appointment_datetime,
+                                 duration, collected_info.get('reason', ''), event_id=event_id)
+        new_appointment = {
+            "patient_id": patient["id"],
+            "doctor_id": doctor["id"],
+            "google_calendar_event_id": event_id,
+            "scheduled_datetime": appointment_datetime.isoformat(),
+            "appointment_type": collected_info.get('appointment_type', 'consultation'),
+            "reason": collected_info.get('reason', ''),
+            "duration_minutes": duration,
+            "status": "scheduled"
+        }
+        appointment_response = await run_query(supabase.table("appointments").insert(new_appointment))
+        return appointment_response.data[0]
+
+    async def _find_or_create_patient(self, collected_info):
+        patient_response = await run_query(
+            supabase.table("patients").select("*").eq("email", collected_info['email']).limit(1))
+        if patient_response.data:
+            return patient_response.data[0]
+        new_patient = {
+            "name": collected_info['name'],
+            "email": collected_info['email'],
+            "phone": collected_info['phone'],
+            "preferred_communication": collected_info.get('preferred_communication', 'sms')
+        }
+        patient_response = await run_query(supabase.table("patients").insert(new_patient))
+        return patient_response.data[0]
@@ -0,0 +1,116 @@
+# calendar_client_pool.py
+
+import threading
+import time
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from http_pools import pooled_session, thread_http
+
+
+class CalendarClientPool:
+    """Reusable Calendar API clients keyed by doctor calendar.
+
+    The discovery document is read once from the copy bundled with
+    google-api-python-client, so building a client never hits the network.
+    Clients sit on httplib2, which is not thread-safe, so each thread gets its
+    own client per calendar while credentials are shared and refreshed in place,
+    one refresh at a time per calendar. All clients on a thread share that thread's keep-alive connection.
+    """
+
+    def __init__(self, api_name='calendar', api_version='v3', api_endpoint=None):
+        self.api_name = api_name
+        self.api_version = api_version
+        self.api_endpoint = api_endpoint
+        self._auth_request = None
+        self._document = None
+        self._credentials = {}
+        self._clients = {}
+        self._refresh_locks = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "builds": 0,
+            "build_seconds": 0.0,
+            "refreshes": 0,
+            "refresh_seconds": 0.0,
+            "reuses": 0
+        }
+
+    def discovery_document(self):
+        if self._document is None:
+            document = get_static_doc(self.api_name, self.api_version)
+            if document is None:
+                raise RuntimeError(f"No bundled discovery document for {self.api_name} {self.api_version}")
+            self._document = document
+        return self._document
+
+    def build(self, credentials):
+        """Build a new client from the bundled discovery document"""
+        started = time.perf_counter()
+        http = thread_http("google")
+        if credentials is not None:
+            from google_auth_httplib2 import AuthorizedHttp
+            http = AuthorizedHttp(credentials, http=http)
+        client = build_from_document(self.discovery_document(), http=http,
+                                     client_options={"api_endpoint": self.api_endpoint} if self.api_endpoint else None)
+        with self._lock:
+            self._stats["builds"] += 1
+            self._stats["build_seconds"] += time.perf_counter() - started
+        return client
+
+    def credentials(self, key, load_credentials):
+        """The shared credentials for ``key``, loading them only the first time"""
+        with self._lock:
+            if key not in self._credentials:
+                self._credentials[key] = load_credentials()
+            return self._credentials[key]
+
+    def get(self, key, load_credentials):
+        """Return a client for ``key``, loading credentials only the first time"""
+        credentials = self.credentials(key, load_credentials)
+        self._refresh_if_needed(key, credentials)
+
+        client_key = (key, threading.get_ident())
+        with self._lock:
+            client = self._clients.get(client_key)
+            if client is not None:
+                self._stats["reuses"] += 1
+                return client
+        # Only this thread uses client_key, so building outside the lock cannot race another build
+        client = self.build(credentials)
+        with self._lock:
+            self._clients[client_key] = client
+        return client
+
+    def invalidate(self, key):
+        """Forget the credentials and clients for ``key``, e.g. after a token is revoked"""
+        with self._lock:
+            self._credentials.pop(key, None)
+            self._refresh_locks.pop(key, None)
+            for client_key in [k for k in self._clients if k[0] == key]:
+                del self._clients[client_key]
+
+    def _refresh_if_needed(self, key, credentials):
+        if credentials is None or credentials.valid or not getattr(credentials, 'refresh_token', None):
+            return
+        with self._lock:
+            refresh_lock = self._refresh_locks.setdefault(key, threading.Lock())
+            if self._auth_request is None:
+                self._auth_request = Request(session=pooled_session("google_auth"))
+        with refresh_lock:
+            # Another thread may have refreshed while we waited
+            if credentials.valid:
+                return
+            started = time.perf_counter()
+            credentials.refresh(self._auth_request)
+            with self._lock:
+                self._stats["refreshes"] += 1
+                self._stats["refresh_seconds"] += time.perf_counter() - started
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["clients"] = len(self._clients)
+        stats["avg_build_ms"] = stats["build_seconds"] * 1000 / stats["builds"] if stats["builds"] else 0.0
+        stats["avg_refresh_ms"] = stats["refresh_seconds"] * 1000 / stats["refreshes"] if stats["refreshes"] else 0.0
+        return stats
@@ -16,11 +16,92 @@ class Config:
     
     # AI services
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+    RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900"))
     
     # Communication services (Supabase has email/SMS but you might keep these)
     TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")  # Only if not using Supabase SMS
     TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
     TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+    TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")
+    # Per-sender throughput: long-code SMS numbers take about 1 msg/s, WhatsApp senders far more
+    TWILIO_SMS_MESSAGES_PER_SECOND = float(os.getenv("TWILIO_SMS_MESSAGES_PER_SECOND", "1"))
+    TWILIO_WHATSAPP_MESSAGES_PER_SECOND = float(os.getenv("TWILIO_WHATSAPP_MESSAGES_PER_SECOND", "20"))
+    # Acknowledge /whatsapp webhooks immediately and reply from a background task
+    WHATSAPP_FAST_ACK = os.getenv("WHATSAPP_FAST_ACK", "false").lower() in ("1", "true", "yes")
+    # Messages a user sends within this window of each other become one agent turn; 0 turns coalescing off.
+    # The wait would sit in front of every synchronous TwiML reply, so it is only on by default with fast acks
+    INBOUND_DEBOUNCE_SECONDS = float(os.getenv("INBOUND_DEBOUNCE_SECONDS", "0.8" if WHATSAPP_FAST_ACK else "0"))
+    INBOUND_MAX_DELAY_SECONDS = float(os.getenv("INBOUND_MAX_DELAY_SECONDS", "3"))
+    # Concurrent WhatsApp turns, and queued messages beyond which new ones get a busy reply instead
+    INBOUND_MAX_IN_FLIGHT = int(os.getenv("INBOUND_MAX_IN_FLIGHT", os.getenv("GROQ_MAX_CONCURRENCY", "16")))
+    INBOUND_MAX_PENDING = int(os.getenv("INBOUND_MAX_PENDING", "500"))
+    
+    # Outbound message queue
+    OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.sqlite3")
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "2"))
+    # A message claimed longer ago than this is assumed lost with its worker and sent again
+    OUTBOX_CLAIM_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_CLAIM_TIMEOUT_SECONDS", "300"))
+    # SQLite calls run on their own threads; a call can wait out sqlite's 5s busy timeout while other workers write
+    OUTBOX_DB_MAX_CONCURRENCY = int(os.getenv("OUTBOX_DB_MAX_CONCURRENCY", "4"))
+    OUTBOX_DB_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_DB_TIMEOUT_SECONDS", "30"))
     
     # Redis (if not using Supabase Realtime)
-    REDIS_URL = os.getenv("REDIS_URL")
\ No newline at end of file
+    REDIS_URL = os.getenv("REDIS_URL")
+    
+    # Conversation contexts
+    CONTEXT_TTL_SECONDS = int(os.getenv("CONTEXT_TTL_SECONDS", "86400"))
+    CONTEXT_MAX_ENTRIES = int(os.getenv("CONTEXT_MAX_ENTRIES", "10000"))
+    
+    # Google Calendar
+    FREEBUSY_CACHE_TTL_SECONDS = int(os.getenv("FREEBUSY_CACHE_TTL_SECONDS", "60"))
+    # How long offered slots stay reserved for the patient they were shown to
+    SLOT_HOLD_TTL_SECONDS = int(os.getenv("SLOT_HOLD_TTL_SECONDS", "300"))
+    
+    # Appointment reads polled by the front desk dashboard
+    APPOINTMENT_CACHE_TTL_SECONDS = int(os.getenv("APPOINTMENT_CACHE_TTL_SECONDS", "30"))
+    APPOINTMENT_CACHE_MAX_ENTRIES = int(os.getenv("APPOINTMENT_CACHE_MAX_ENTRIES", "5000"))
+    
+    # Concurrency limits and timeouts for blocking clients run off the event loop
+    GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "16"))
+    GROQ_TIMEOUT_SECONDS = float(os.getenv("GROQ_TIMEOUT_SECONDS", "30"))
+    TWILIO_MAX_CONCURRENCY = int(os.getenv("TWILIO_MAX_CONCURRENCY", "8"))
+    TWILIO_TIMEOUT_SECONDS = float(os.getenv("TWILIO_TIMEOUT_SECONDS", "15"))
+    SUPABASE_MAX_CONCURRENCY = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "16"))
+    SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+    CALENDAR_MAX_CONCURRENCY = int(os.getenv("CALENDAR_MAX_CONCURRENCY", "8"))
+    CALENDAR_TIMEOUT_SECONDS = float(os.getenv("CALENDAR_TIMEOUT_SECONDS", "20"))
+    
+    # Doctors change rarely; the in-memory directory reloads them after this many seconds
+    DOCTOR_DIRECTORY_TTL_SECONDS = int(os.getenv("DOCTOR_DIRECTORY_TTL_SECONDS", "300"))
+    
+    # Scheduler jobs
+    SCHEDULER_SEND_CONCURRENCY = int(os.getenv("SCHEDULER_SEND_CONCURRENCY", "8"))
+    # Every worker runs the scheduler; leases decide which one sends what (see coordination.py)
+    RUN_SCHEDULER = os.getenv("RUN_SCHEDULER", "true").lower() == "true"
+    SCHEDULER_SHARD_COUNT = int(os.getenv("SCHEDULER_SHARD_COUNT", "1"))
+    # 0 means a node may own every shard
+    SCHEDULER_MAX_SHARDS_PER_NODE = int(os.getenv("SCHEDULER_MAX_SHARDS_PER_NODE", "0"))
+    SCHEDULER_LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "30"))
+    SCHEDULER_LEASE_RENEW_SECONDS = int(os.getenv("SCHEDULER_LEASE_RENEW_SECONDS", "10"))
+    # Without REDIS_URL, leases are file locks here, which coordinates the workers of a single host
+    SCHEDULER_LEASE_DIR = os.getenv("SCHEDULER_LEASE_DIR", "scheduler-leases")
+    REMINDER_OFFSETS_HOURS = [int(hours) for hours in os.getenv("REMINDER_OFFSETS_HOURS", "24").split(",")]
+    # Appointments are queued this long before their earliest reminder is due; keep it above the refill interval
+    REMINDER_LOOKAHEAD_SECONDS = int(os.getenv("REMINDER_LOOKAHEAD_SECONDS", "900"))
+    REMINDER_REFILL_SECONDS = int(os.getenv("REMINDER_REFILL_SECONDS", "300"))
+    REMINDER_GRACE_SECONDS = int(os.getenv("REMINDER_GRACE_SECONDS", "1800"))
+    # How often the loaded horizon is re-read for bookings and reschedules made on other workers
+    REMINDER_RESCAN_SECONDS = int(os.getenv("REMINDER_RESCAN_SECONDS", "300"))
+    
+    # Shared keep-alive HTTP pools (http_pools.py); HTTP/2 is used where the client and the h2 package support it
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+    HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    
+    # Services to build in the background at startup: comma-separated names from services.registry, or "all"
+    WARM_UP_SERVICES = [name.strip() for name in os.getenv("WARM_UP_SERVICES", "").split(",") if name.strip()]
+    
+    # Requests slower than this are logged with a per-dependency time breakdown
+    SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "2"))
@@ -0,0 +1,110 @@
+# context_store.py
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from config import Config
+
+
+def new_context():
+    return {'stage': 'greeting', 'collected_info': {}}
+
+
+class ContextStore:
+    """Conversation state per user.
+
+    ``update`` applies ``fn(context) -> context`` atomically, so concurrent
+    turns for the same user cannot overwrite each other's stage or
+    collected info.
+    """
+
+    async def get(self, user_id):
+        raise NotImplementedError
+
+    async def update(self, user_id, fn):
+        raise NotImplementedError
+
+    async def delete(self, user_id):
+        raise NotImplementedError
+
+
+class InMemoryContextStore(ContextStore):
+    """Per-process store bounded by LRU eviction and an idle TTL"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    async def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        context, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(user_id, None)
+            return None
+        self._entries.move_to_end(user_id)
+        return json.loads(json.dumps(context))
+
+    async def update(self, user_id, fn):
+        async with self._lock:
+            context = await self.get(user_id) or new_context()
+            context = fn(context)
+            self._entries[user_id] = (context, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return json.loads(json.dumps(context))
+
+    async def delete(self, user_id):
+        self._entries.pop(user_id, None)
+
+
+class RedisContextStore(ContextStore):
+    """Store shared by all workers; contexts expire ``ttl_seconds`` after their last update"""
+
+    def __init__(self, client=None, url=None, ttl_seconds=86400, prefix='conversation:'):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def _key(self, user_id):
+        return f"{self.prefix}{user_id}"
+
+    async def get(self, user_id):
+        raw = await self.client.get(self._key(user_id))
+        return json.loads(raw) if raw else None
+
+    async def update(self, user_id, fn):
+        from redis.exceptions import WatchError
+
+        key = self._key(user_id)
+        async with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    context = fn(json.loads(raw) if raw else new_context())
+                    pipe.multi()
+                    pipe.set(key, json.dumps(context), ex=self.ttl_seconds)
+                    await pipe.execute()
+                    return context
+                except WatchError:
+                    # Another worker updated this conversation first; re-read and retry
+                    continue
+
+    async def delete(self, user_id):
+        await self.client.delete(self._key(user_id))
+
+
+def create_context_store():
+    """Redis-backed store when REDIS_URL is configured, otherwise in-memory"""
+    if Config.REDIS_URL:
+        return RedisContextStore(url=Config.REDIS_URL, ttl_seconds=Config.CONTEXT_TTL_SECONDS)
+    return InMemoryContextStore(max_entries=Config.CONTEXT_MAX_ENTRIES, ttl_seconds=Config.CONTEXT_TTL_SECONDS)
@@ -0,0 +1,129 @@
+# coordination.py
+
+import asyncio
+import os
+import socket
+import uuid
+import zlib
+from booking import RedisSlotHoldStore
+from config import Config
+
+
+def shard_of(appointment_id, shard_count):
+    return int(appointment_id) % shard_count
+
+
+class FileLeaseStore:
+    """Leases shared by the workers of one host: an exclusive flock per key.
+
+    The operating system drops the lock when the process dies, so the TTL is
+    not needed here. Same interface as the slot hold stores in booking.py.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = {}
+
+    async def hold(self, key, owner, ttl_seconds):
+        if key in self._files:
+            return True
+        import fcntl
+        os.makedirs(self.directory, exist_ok=True)
+        handle = open(os.path.join(self.directory, key.replace(':', '_')), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+        self._files[key] = handle
+        return True
+
+    async def release(self, key, owner):
+        handle = self._files.pop(key, None)
+        if handle:
+            handle.close()
+
+
+def create_lease_store():
+    """Redis leases across nodes when REDIS_URL is configured, otherwise file locks on this host"""
+    if Config.REDIS_URL:
+        return RedisSlotHoldStore(url=Config.REDIS_URL, prefix='scheduler_lease:')
+    return FileLeaseStore(Config.SCHEDULER_LEASE_DIR)
+
+
+class SchedulerCoordinator:
+    """Decides which worker sends which appointments' notifications.
+
+    Appointments are split into ``shard_count`` shards by ``id % shard_count``
+    and each shard is a lease, renewed every ``renew_seconds`` and expiring
+    after ``ttl_seconds``. With one shard this is plain leader election; with
+    more, nodes share the sends and a dead node's shards move to the others
+    within one TTL. ``on_change(gained, lost)`` is called when ownership moves.
+    """
+
+    def __init__(self, store=None, shard_count=None, max_shards=None, ttl_seconds=None, renew_seconds=None,
+                 owner=None):
+        self.store = store
+        self.shard_count = shard_count or Config.SCHEDULER_SHARD_COUNT
+        self.max_shards = max_shards or Config.SCHEDULER_MAX_SHARDS_PER_NODE or self.shard_count
+        self.ttl_seconds = ttl_seconds or Config.SCHEDULER_LEASE_TTL_SECONDS
+        self.renew_seconds = renew_seconds or Config.SCHEDULER_LEASE_RENEW_SECONDS
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.shards = set()
+        self.on_change = None
+        self._task = None
+
+    def owns(self, appointment_id):
+        return shard_of(appointment_id, self.shard_count) in self.shards
+
+    async def heartbeat(self):
+        """Renew the leases we hold and take free ones up to ``max_shards``; returns (gained, lost)"""
+        if self.store is None:
+            self.store = create_lease_store()
+        lost = {shard for shard in self.shards if not await self._hold(shard)}
+        self.shards -= lost
+        gained = set()
+        # Start from a per-owner offset so nodes do not all contend for shard 0 first
+        first = zlib.crc32(self.owner.encode()) % self.shard_count
+        for step in range(self.shard_count):
+            if len(self.shards) >= self.max_shards:
+                break
+            shard = (first + step) % self.shard_count
+            if shard not in self.shards and shard not in lost and await self._hold(shard):
+                self.shards.add(shard)
+                gained.add(shard)
+        return gained, lost
+
+    async def _hold(self, shard):
+        try:
+            return await self.store.hold(f"shard:{shard}", self.owner, self.ttl_seconds)
+        except Exception as e:
+            print(f"Scheduler lease for shard {shard} could not be renewed: {e}")
+            return False
+
+    async def run(self):
+        while True:
+            gained, lost = await self.heartbeat()
+            if (gained or lost) and self.on_change:
+                print(f"Scheduler {self.owner} now owns shards {sorted(self.shards)}")
+                self.on_change(gained, lost)
+            await asyncio.sleep(self.renew_seconds)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        """Stop renewing and hand our shards back straight away"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for shard in self.shards:
+            try:
+                await self.store.release(f"shard:{shard}", self.owner)
+            except Exception:
+                pass
+        self.shards.clear()
+
+    def stats(self):
+        return {"shards_owned": len(self.shards), "shard_count": self.shard_count}
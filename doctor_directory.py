@@ -0,0 +1,109 @@
+# doctor_directory.py
+
+import asyncio
+import difflib
+import re
+import time
+import unicodedata
+from async_services import run_query
+from supabase_client import supabase
+
+_TITLES = {'dr', 'doctor', 'prof', 'professor'}
+
+
+def normalize_name(value):
+    """Lowercase, strip accents, punctuation and titles: 'Dr. José Smith' -> 'jose smith'"""
+    value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode('ascii')
+    tokens = re.findall(r'[a-z0-9]+', value.lower())
+    return ' '.join(token for token in tokens if token not in _TITLES)
+
+
+class DoctorDirectory:
+    """In-memory copy of the doctors table with name and specialty indexes.
+
+    The table is reloaded when the TTL expires or on an explicit ``refresh()``;
+    every reload bumps ``version`` so callers can cache data derived from it.
+    """
+
+    def __init__(self, ttl_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._doctors = []
+        self._by_name = {}
+        self._by_token = {}
+        self._by_specialty = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    async def get_doctors(self):
+        await self._ensure_fresh()
+        return self._doctors
+
+    async def find_by_name(self, name):
+        """Fuzzy doctor lookup: exact name, then all tokens, then substring, then close spelling"""
+        await self._ensure_fresh()
+        query = normalize_name(name)
+        if not query:
+            return None
+        if query in self._by_name:
+            return self._by_name[query]
+
+        tokens = query.split()
+        candidates = set.intersection(*(self._by_token.get(token, set()) for token in tokens))
+        if candidates:
+            return self._doctors[min(candidates)]
+
+        for normalized, doctor in self._by_name.items():
+            if query in normalized:
+                return doctor
+
+        close = difflib.get_close_matches(query, self._by_name.keys(), n=1, cutoff=0.8)
+        if close:
+            return self._by_name[close[0]]
+        close = difflib.get_close_matches(tokens[-1], self._by_token.keys(), n=1, cutoff=0.8)
+        if close:
+            return self._doctors[min(self._by_token[close[0]])]
+        return None
+
+    async def by_specialty(self, specialty):
+        await self._ensure_fresh()
+        return list(self._by_specialty.get(normalize_name(specialty), []))
+
+    async def refresh(self):
+        """Reload the doctors table now"""
+        async with self._lock:
+            await self._load()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def _ensure_fresh(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            # Another request may have reloaded while we waited for the lock
+            if not self._is_fresh():
+                await self._load()
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def _load(self):
+        response = await run_query(supabase.table("doctors").select("*"))
+        self._build_indexes(response.data or [])
+        self._loaded_at = time.monotonic()
+
+    def _build_indexes(self, doctors):
+        by_name, by_token, by_specialty = {}, {}, {}
+        for position, doctor in enumerate(doctors):
+            normalized = normalize_name(doctor.get('name'))
+            by_name.setdefault(normalized, doctor)
+            for token in normalized.split():
+                by_token.setdefault(token, set()).add(position)
+            if doctor.get('specialty'):
+                by_specialty.setdefault(normalize_name(doctor['specialty']), []).append(doctor)
+        self._doctors = doctors
+        self._by_name = by_name
+        self._by_token = by_token
+        self._by_specialty = by_specialty
+        self.version += 1
@@ -0,0 +1,126 @@
+# fast_path.py
+
+import re
+import threading
+
+EMAIL_RE = re.compile(r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}$')
+PHONE_RE = re.compile(r'^\+?[\d\s().-]{7,20}$')
+# 1990-05-12 or 12.05.2024 have enough digits for a phone number but are dates (e.g. a date of birth)
+DATE_LIKE_RE = re.compile(r'^\s*(\d{4}[-. ]\d{1,2}[-. ]\d{1,2}|\d{1,2}[-. ]\d{1,2}[-. ]\d{4})\s*$')
+CHOICE_RE = re.compile(r'^#?(\d{1,2})[.)]?$')
+
+REQUIRED_FIELDS = [
+    ('name', "What's your full name?"),
+    ('email', "What's your email address?"),
+    ('phone', "What's the best phone number to reach you?"),
+    ('reason', "What's the reason for your visit?")
+]
+
+
+def _response(message, next_stage, extracted_info=None, action_needed="none"):
+    return {
+        "message": message,
+        "next_stage": next_stage,
+        "extracted_info": extracted_info or {},
+        "action_needed": action_needed
+    }
+
+
+def normalize_phone(value):
+    """'+1 (555) 123-4567' -> '+15551234567'; None unless it has 7-15 digits and is not shaped like a date"""
+    if not PHONE_RE.match(value) or (not value.startswith('+') and DATE_LIKE_RE.match(value)):
+        return None
+    digits = re.sub(r'\D', '', value)
+    if not 7 <= len(digits) <= 15:
+        return None
+    return ('+' if value.startswith('+') else '') + digits
+
+
+class FastPathHandler:
+    """Rule-based answers for turns that do not need the LLM.
+
+    ``handle`` returns a response in the same shape the LLM produces (so the
+    agent applies ``next_stage``/``extracted_info`` the same way), or None
+    to fall through to Groq.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._misses = 0
+
+    def handle(self, context, message):
+        text = message.strip()
+        for rule in (self._keyword, self._slot_choice, self._email, self._phone):
+            response = rule(context, text)
+            if response is not None:
+                name = rule.__name__.lstrip('_')
+                with self._lock:
+                    self._hits[name] = self._hits.get(name, 0) + 1
+                return response
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self._hits.values())
+            total = hits + self._misses
+            return {
+                "hits": hits,
+                "misses": self._misses,
+                "hit_rate": hits / total if total else 0.0,
+                "hits_by_rule": dict(self._hits)
+            }
+
+    def _keyword(self, context, text):
+        keyword = text.upper().rstrip('.!')
+        if keyword == 'CONFIRM':
+            collected = context['collected_info']
+            if context['stage'] == 'confirmation' and collected.get('selected_slot') and not self._missing(collected):
+                return _response("Booking your appointment now...", 'confirmation', action_needed='book_appointment')
+            return _response("Thank you, your appointment is confirmed. See you then!", context['stage'],
+                             action_needed='confirm_appointment')
+        if keyword == 'RESCHEDULE':
+            return _response("No problem. Which day and time would suit you better?", 'scheduling',
+                             {'reschedule_requested': True})
+        return None
+
+    def _slot_choice(self, context, text):
+        offered = context.get('offered_slots')
+        match = CHOICE_RE.match(text)
+        if not offered or not match or context['stage'] != 'scheduling':
+            return None
+        choice = int(match.group(1))
+        if not 1 <= choice <= len(offered):
+            return _response(f"Please reply with a number between 1 and {len(offered)}.", 'scheduling')
+        slot = offered[choice - 1]
+        return _response(f"You picked {slot['display']}. Reply CONFIRM to book it.", 'confirmation',
+                         {'selected_slot': slot['datetime']})
+
+    def _email(self, context, text):
+        if context['stage'] != 'info_collection' or not EMAIL_RE.match(text):
+            return None
+        return self._next_field(context, {'email': text.lower()})
+
+    def _phone(self, context, text):
+        if context['stage'] != 'info_collection':
+            return None
+        phone = normalize_phone(text)
+        if phone is None:
+            return None
+        return self._next_field(context, {'phone': phone})
+
+    def _next_field(self, context, extracted):
+        collected = {**context['collected_info'], **extracted}
+        missing = self._missing(collected)
+        if missing:
+            return _response(f"Thanks! {missing[0][1]}", 'info_collection', extracted)
+        if collected.get('doctor_name'):
+            return _response("Thanks, I have everything I need. Let me check the available times.", 'scheduling',
+                             extracted, 'get_availability')
+        return _response("Thanks, I have everything I need. Which doctor would you like to see?",
+                         'doctor_selection', extracted)
+
+    def _missing(self, collected):
+        return [(field, prompt) for field, prompt in REQUIRED_FIELDS if not collected.get(field)]
@@ -0,0 +1,67 @@
+# freebusy_cache.py
+
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+
+def widen_window(start_date, end_date):
+    """Round a query window out to whole days so nearby requests share one cache entry"""
+    time_min = datetime.combine(start_date.date(), dt_time.min, tzinfo=start_date.tzinfo)
+    time_max = datetime.combine(end_date.date() + timedelta(days=1), dt_time.min, tzinfo=end_date.tzinfo)
+    return time_min, time_max
+
+
+def _naive_utc(value):
+    """Aware datetimes converted to naive UTC, so aware and naive windows compare; naive ones are UTC already"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class FreeBusyCache:
+    """Per-calendar cache of Google free/busy periods with a TTL"""
+
+    def __init__(self, ttl_seconds=60):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, calendar_id, start_date, end_date):
+        """Return cached busy periods covering the window, or None"""
+        with self._lock:
+            entry = self._entries.get(calendar_id)
+            if entry:
+                time_min, time_max, busy, expires_at = entry
+                if expires_at <= time.monotonic():
+                    del self._entries[calendar_id]
+                elif time_min <= _naive_utc(start_date) and _naive_utc(end_date) <= time_max:
+                    self.hits += 1
+                    return busy
+            self.misses += 1
+            return None
+
+    def put(self, calendar_id, time_min, time_max, busy):
+        with self._lock:
+            self._entries[calendar_id] = (_naive_utc(time_min), _naive_utc(time_max), busy,
+                                          time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, calendar_id):
+        with self._lock:
+            self._entries.pop(calendar_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
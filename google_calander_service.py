@@ -1,24 +1,45 @@
 # google_calendar_service.py
 
-import os
-from datetime import datetime, timedelta
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-import json
+import heapq
+from datetime import timedelta
+from itertools import dropwhile, islice
+from googleapiclient.errors import HttpError
+from calendar_client_pool import CalendarClientPool
 from config import Config
+from freebusy_cache import FreeBusyCache, widen_window
+from metrics import track
+from reminders import parse_utc
+from slot_engine import iter_free_slots, load_working_hours, parse_busy_periods
+
+
+class CalendarUnavailable(Exception):
+    """Google could not report free/busy for a calendar, so its availability is unknown"""
+
+
+def _rfc3339(value):
+    """Format a datetime for the Calendar API, treating naive values as UTC"""
+    if value.tzinfo is None:
+        return value.isoformat() + 'Z'
+    return value.isoformat()
 
 
 class GoogleCalendarService:
+    # The freebusy endpoint accepts at most 50 calendars per query
+    FREEBUSY_BATCH_SIZE = 50
+
     def __init__(self):
         self.SCOPES = [
             'https://www.googleapis.com/auth/calendar', 
             'https://www.googleapis.com/auth/forms', 
             'https://www.googleapis.com/auth/drive' 
         ]
+        self.freebusy_cache = FreeBusyCache(ttl_seconds=Config.FREEBUSY_CACHE_TTL_SECONDS)
+        self.client_pool = CalendarClientPool()
 
     def get_authorization_url(self):
         """Get Google OAuth URL for calendar access"""
+        # Only the OAuth routes need oauthlib, so it is not imported with the service
+        from google_auth_oauthlib.flow import Flow
         flow = Flow.from_client_config(
             {
                 "web": {
@@ -43,62 +64,169 @@ class GoogleCalendarService:
 
     def build_service(self, credentials):
         """Build Google Calendar service using credentials"""
-        return build('calendar', 'v3', credentials=credentials)
+        return self.client_pool.build(credentials)
 
-    def get_available_slots(self, doctor, start_date, end_date, duration_minutes=30):
-        """Get available appointment slots for a doctor"""
-        credentials = self._get_doctor_credentials(doctor)
-        service = self.build_service(credentials)
+    def _calendar_client(self, doctor):
+        """Pooled Calendar client for the doctor's calendar"""
+        return self.client_pool.get(doctor['google_calendar_id'], lambda: self._get_doctor_credentials(doctor))
 
-        busy_query = {
-            'timeMin': start_date.isoformat(),
-            'timeMax': end_date.isoformat(),
-            'items': [{'id': doctor['google_calendar_id']}]
-        }
+    def _doctor_credentials(self, doctor):
+        return self.client_pool.credentials(doctor['google_calendar_id'], lambda: self._get_doctor_credentials(doctor))
 
-        busy_times = service.freebusy().query(body=busy_query).execute()
-        busy_periods = busy_times['calendars'][doctor['google_calendar_id']]['busy']
+    def get_available_slots(self, doctor, start_date, end_date, duration_minutes=30, limit=None):
+        """Get available appointment slots for a doctor, stopping after ``limit`` slots"""
+        return list(islice(self.iter_available_slots(doctor, start_date, end_date, duration_minutes), limit))
 
-        working_hours = json.loads(doctor.get('working_hours', '{}')) or {
-            'monday': {'start': '09:00', 'end': '17:00'},
-            'tuesday': {'start': '09:00', 'end': '17:00'},
-            'wednesday': {'start': '09:00', 'end': '17:00'},
-            'thursday': {'start': '09:00', 'end': '17:00'},
-            'friday': {'start': '09:00', 'end': '17:00'}
-        }
+    def iter_available_slots(self, doctor, start_date, end_date, duration_minutes=30):
+        """Lazily yield available appointment slots for a doctor"""
+        busy = parse_busy_periods(self._busy_periods(doctor, start_date, end_date), aware=start_date.tzinfo is not None)
+        return iter_free_slots(busy, load_working_hours(doctor), start_date, end_date, duration_minutes)
+
+    def get_earliest_slots(self, doctors, start_date, end_date, limit=10, duration_minutes=30):
+        """The earliest ``limit`` free slots across ``doctors`` as (slot, doctor) pairs, soonest first.
+
+        Doctors are visited in order of the first slot their working hours
+        allow and their calendars are read in freebusy batches, each at most
+        once. Per-doctor slot streams are merged lazily, and as soon as
+        ``limit`` slots are found that no remaining doctor could beat, the
+        remaining calendars are not read at all. Doctors whose calendar could
+        not be read are left out rather than shown as free.
+        """
+        aware = start_date.tzinfo is not None
+        candidates = []
+        for doctor in doctors:
+            working_hours = load_working_hours(doctor)
+            earliest = next(self._upcoming_slots([], working_hours, start_date, end_date, duration_minutes), None)
+            if earliest is not None:
+                candidates.append((earliest, len(candidates), doctor, working_hours))
+        candidates.sort(key=lambda candidate: candidate[:2])
+
+        best = []
+        position = 0
+        while position < len(candidates):
+            batch = []
+            for candidate in candidates[position:position + self.FREEBUSY_BATCH_SIZE]:
+                # Candidates are sorted, so once one cannot beat the current top ``limit`` none can
+                if len(best) == limit and candidate[0] >= best[-1][0]:
+                    break
+                batch.append(candidate)
+            if not batch:
+                break
+            position += len(batch)
+
+            busy_by_calendar = self.get_busy_periods([doctor for _, _, doctor, _ in batch], start_date, end_date)
+            streams = [
+                self._tagged(index, self._upcoming_slots(
+                    parse_busy_periods(busy_by_calendar[doctor['google_calendar_id']], aware),
+                    working_hours, start_date, end_date, duration_minutes))
+                for _, index, doctor, working_hours in batch
+                if doctor['google_calendar_id'] in busy_by_calendar
+            ]
+            best = list(islice(heapq.merge(best, *streams), limit))
+
+        doctors_by_index = {index: doctor for _, index, doctor, _ in candidates}
+        return [(slot, doctors_by_index[index]) for slot, index in best]
+
+    def _upcoming_slots(self, busy, working_hours, start_date, end_date, duration_minutes):
+        # iter_free_slots lays out whole days; a search for the next slot must not offer ones already past
+        return dropwhile(lambda slot: slot < start_date,
+                         iter_free_slots(busy, working_hours, start_date, end_date, duration_minutes))
 
-        available_slots = []
-        current_date = start_date.date()
-        while current_date <= end_date.date():
-            day_name = current_date.strftime('%A').lower()
-            if day_name in working_hours:
-                day_hours = working_hours[day_name]
-                start_time = datetime.combine(current_date,
-                                              datetime.strptime(day_hours['start'], '%H:%M').time())
-                end_time = datetime.combine(current_date,
-                                            datetime.strptime(day_hours['end'], '%H:%M').time())
-
-                current_slot = start_time
-                while current_slot + timedelta(minutes=duration_minutes) <= end_time:
-                    slot_end = current_slot + timedelta(minutes=duration_minutes)
-                    is_available = True
-                    for busy_period in busy_periods:
-                        busy_start = datetime.fromisoformat(busy_period['start'].replace('Z', '+00:00'))
-                        busy_end = datetime.fromisoformat(busy_period['end'].replace('Z', '+00:00'))
-                        if (current_slot < busy_end and slot_end > busy_start):
-                            is_available = False
-                            break
-                    if is_available:
-                        available_slots.append(current_slot)
-                    current_slot += timedelta(minutes=duration_minutes)
-            current_date += timedelta(days=1)
-
-        return available_slots
-
-    def create_appointment(self, doctor, patient, appointment_datetime, duration_minutes, reason):
-        """Create a new appointment in Google Calendar"""
-        credentials = self._get_doctor_credentials(doctor)
-        service = self.build_service(credentials)
+    def _tagged(self, index, slots):
+        for slot in slots:
+            yield slot, index
+
+    def get_busy_periods(self, doctors, start_date, end_date):
+        """Get busy periods for several doctors, batching cache misses into freebusy queries.
+
+        Only calendars read with the same credentials share a query. Calendars
+        Google reports errors for are left out of the result, never returned
+        as having no busy periods.
+        """
+        busy_by_calendar = {}
+        missing = []
+        for doctor in doctors:
+            calendar_id = doctor['google_calendar_id']
+            busy = self.freebusy_cache.get(calendar_id, start_date, end_date)
+            if busy is None:
+                missing.append(doctor)
+            else:
+                busy_by_calendar[calendar_id] = busy
+        if not missing:
+            return busy_by_calendar
+
+        time_min, time_max = widen_window(start_date, end_date)
+        by_credentials = {}
+        for doctor in missing:
+            by_credentials.setdefault(id(self._doctor_credentials(doctor)), []).append(doctor)
+        for group in by_credentials.values():
+            service = self._calendar_client(group[0])
+            for offset in range(0, len(group), self.FREEBUSY_BATCH_SIZE):
+                batch = group[offset:offset + self.FREEBUSY_BATCH_SIZE]
+                busy_query = {
+                    'timeMin': _rfc3339(time_min),
+                    'timeMax': _rfc3339(time_max),
+                    'items': [{'id': doctor['google_calendar_id']} for doctor in batch]
+                }
+                with track('google_calendar', 'freebusy.query'):
+                    busy_times = service.freebusy().query(body=busy_query).execute()
+                for doctor in batch:
+                    calendar_id = doctor['google_calendar_id']
+                    calendar = busy_times['calendars'].get(calendar_id)
+                    if calendar is None or calendar.get('errors'):
+                        print(f"Free/busy unavailable for {calendar_id}: {(calendar or {}).get('errors')}")
+                        continue
+                    self.freebusy_cache.put(calendar_id, time_min, time_max, calendar.get('busy', []))
+                    busy_by_calendar[calendar_id] = calendar.get('busy', [])
+        return busy_by_calendar
+
+    def _busy_periods(self, doctor, start_date, end_date):
+        """Busy periods for one doctor; raises CalendarUnavailable if Google could not read the calendar"""
+        busy_by_calendar = self.get_busy_periods([doctor], start_date, end_date)
+        if doctor['google_calendar_id'] not in busy_by_calendar:
+            raise CalendarUnavailable(f"Free/busy unavailable for {doctor['google_calendar_id']}")
+        return busy_by_calendar[doctor['google_calendar_id']]
+
+    def invalidate_availability(self, doctor):
+        """Drop cached free/busy data after the doctor's calendar changes"""
+        self.freebusy_cache.invalidate(doctor['google_calendar_id'])
+
+    def is_slot_free(self, doctor, start, duration_minutes, event_id=None):
+        """Read the doctor's calendar fresh (not from the cache) and check nothing overlaps the slot.
+
+        Our own event from an earlier attempt of the same booking (``event_id``) is not a conflict.
+        """
+        self.invalidate_availability(doctor)
+        end = start + timedelta(minutes=duration_minutes)
+        busy = parse_busy_periods(self._busy_periods(doctor, start, end), aware=start.tzinfo is not None)
+        if not any(busy_start < end and start < busy_end for busy_start, busy_end in busy):
+            return True
+        return event_id is not None and self._event_exists(doctor, event_id)
+
+    def _event_exists(self, doctor, event_id):
+        return self._get_event(doctor, event_id) is not None
+
+    def _is_own_event(self, doctor, event_id, appointment_datetime):
+        event = self._get_event(doctor, event_id)
+        if event is None or 'dateTime' not in event.get('start', {}):
+            return False
+        return parse_utc(event['start']['dateTime']) == parse_utc(appointment_datetime)
+
+    def _get_event(self, doctor, event_id):
+        """The live event with ``event_id``, or None if there is none or it was deleted"""
+        service = self._calendar_client(doctor)
+        try:
+            with track('google_calendar', 'events.get'):
+                event = service.events().get(calendarId=doctor['google_calendar_id'], eventId=event_id).execute()
+        except HttpError as e:
+            if e.resp.status in (404, 410):
+                return None
+            raise
+        return None if event.get('status') == 'cancelled' else event
+
+    def create_appointment(self, doctor, patient, appointment_datetime, duration_minutes, reason, event_id=None):
+        """Create a new appointment in Google Calendar; a known ``event_id`` makes retries idempotent"""
+        service = self._calendar_client(doctor)
 
         event = {
             'summary': f'Appointment: {patient["name"]}',
@@ -123,7 +251,18 @@ class GoogleCalendarService:
             },
         }
 
-        created_event = service.events().insert(calendarId=doctor['google_calendar_id'], body=event).execute()
+        if event_id:
+            event['id'] = event_id
+
+        try:
+            with track('google_calendar', 'events.insert'):
+                created_event = service.events().insert(calendarId=doctor['google_calendar_id'], body=event).execute()
+        except HttpError as e:
+            # 409 means the id is taken; it is our earlier attempt only if that event is live and at this time
+            if event_id and e.resp.status == 409 and self._is_own_event(doctor, event_id, appointment_datetime):
+                return event_id
+            raise
+        self.invalidate_availability(doctor)
         return created_event['id']
 
     def _get_doctor_credentials(self, doctor):
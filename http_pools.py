@@ -0,0 +1,132 @@
+# http_pools.py
+
+import threading
+from config import Config
+
+
+class ConnectionStats:
+    """Requests sent and new connections opened, per provider"""
+
+    def __init__(self):
+        self._counts = {}
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, requests=0, connections=0):
+        with self._lock:
+            counts = self._counts.setdefault(name, [0, 0])
+            counts[0] += requests
+            counts[1] += connections
+
+    def add_source(self, name, read_counts):
+        """``read_counts() -> (requests, connections)`` for transports that keep their own counters"""
+        self._sources.setdefault(name, []).append(read_counts)
+
+    def stats(self):
+        with self._lock:
+            totals = {name: list(counts) for name, counts in self._counts.items()}
+        for name, sources in self._sources.items():
+            for read_counts in sources:
+                requests, connections = read_counts()
+                counts = totals.setdefault(name, [0, 0])
+                counts[0] += requests
+                counts[1] += connections
+        stats = {}
+        for name, (requests, connections) in totals.items():
+            stats[f"{name}_requests"] = requests
+            stats[f"{name}_connections"] = connections
+            # Share of requests that went out on an already-open (already TLS-negotiated) connection
+            stats[f"{name}_reuse_ratio"] = 1 - connections / requests if requests else 0.0
+        return stats
+
+
+connection_stats = ConnectionStats()
+
+
+def pooled_session(name):
+    """A requests Session with a keep-alive pool sized for our worker threads (Twilio, Google auth)"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=Config.HTTP_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    def read_counts():
+        # urllib3 counts requests and new connections on each host pool
+        pools = adapter.poolmanager.pools
+        host_pools = [pools[key] for key in list(pools.keys()) if key in pools]
+        return (sum(pool.num_requests for pool in host_pools),
+                sum(pool.num_connections for pool in host_pools))
+
+    connection_stats.add_source(name, read_counts)
+    return session
+
+
+def pooled_httpx_client(name, **kwargs):
+    """An httpx Client with tuned limits and HTTP/2 when the h2 package is installed (Supabase, Groq)"""
+    import httpx
+
+    def trace(event, info):
+        if event == "connection.connect_tcp.complete":
+            connection_stats.count(name, connections=1)
+
+    def on_request(request):
+        connection_stats.count(name, requests=1)
+        request.extensions["trace"] = trace
+
+    return httpx.Client(
+        http2=Config.HTTP2_ENABLED and _h2_available(),
+        limits=httpx.Limits(max_connections=Config.HTTP_POOL_MAXSIZE,
+                            max_keepalive_connections=Config.HTTP_POOL_MAXSIZE,
+                            keepalive_expiry=Config.HTTP_KEEPALIVE_SECONDS),
+        event_hooks={"request": [on_request]},
+        **kwargs
+    )
+
+
+def _h2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+_thread_http = threading.local()
+
+
+def thread_http(name):
+    """This thread's httplib2 Http for the Google API clients.
+
+    httplib2 is not thread-safe, so connections cannot be shared across
+    threads, but every calendar client on a thread goes through one Http and
+    its keep-alive connection instead of opening its own.
+    """
+    http = getattr(_thread_http, name, None)
+    if http is None:
+        http = _counting_http_class()(name, timeout=Config.CALENDAR_TIMEOUT_SECONDS)
+        setattr(_thread_http, name, http)
+    return http
+
+
+_http_class = None
+
+
+def _counting_http_class():
+    global _http_class
+    if _http_class is None:
+        import httplib2
+
+        class CountingHttp(httplib2.Http):
+            def __init__(self, name, **kwargs):
+                super().__init__(**kwargs)
+                self.stats_name = name
+
+            def _conn_request(self, conn, request_uri, method, body, headers):
+                connection_stats.count(self.stats_name, requests=1, connections=int(conn.sock is None))
+                return super()._conn_request(conn, request_uri, method, body, headers)
+
+        _http_class = CountingHttp
+    return _http_class
@@ -0,0 +1,113 @@
+# inbound.py
+
+import asyncio
+from collections import OrderedDict, deque
+
+
+class PerUserDispatcher:
+    """Per-user mailboxes for inbound messages.
+
+    Each user with pending messages has one worker task, so a user's turns
+    run strictly in order while different users are processed concurrently.
+    Messages that arrive within ``debounce_seconds`` of each other (but no
+    later than ``max_delay_seconds`` after the first) are coalesced into one
+    turn. At most ``max_in_flight`` turns run at once, and once
+    ``max_pending`` messages are waiting new ones are shed instead of queued.
+    """
+
+    def __init__(self, handler, dedup_size=10000, debounce_seconds=0.0, max_delay_seconds=3.0, max_batch=10,
+                 max_in_flight=16, max_pending=500):
+        self.handler = handler
+        self.dedup_size = dedup_size
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._queues = {}
+        self._workers = {}
+        self._seen = OrderedDict()
+        self._in_flight = 0
+        self._stats = {"messages": 0, "turns": 0, "coalesced": 0, "shed": 0}
+
+    def original_reply(self, message_id):
+        """The reply future of an already accepted ``message_id`` (webhook retries reuse the MessageSid), or None"""
+        if not message_id:
+            return None
+        return self._seen.get(message_id)
+
+    def submit(self, user_id, message, message_id=None):
+        """Queue a message; returns None if it was shed, otherwise a future.
+
+        The future resolves to the handler's result for the message that
+        closes a turn, and to None for messages coalesced into a later one.
+        """
+        if self.pending() >= self.max_pending:
+            self._stats["shed"] += 1
+            return None
+        loop = asyncio.get_running_loop()
+        reply = loop.create_future()
+        if message_id:
+            self._seen[message_id] = reply
+            if len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+        self._queues.setdefault(user_id, deque()).append((message, message_id, reply, loop.time()))
+        self._stats["messages"] += 1
+        if user_id not in self._workers:
+            self._workers[user_id] = asyncio.create_task(self._work(user_id))
+        return reply
+
+    def pending(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def drain(self):
+        """Wait until every queued message has been handled"""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    def stats(self):
+        return {**self._stats, "pending": self.pending(), "in_flight": self._in_flight, "users": len(self._workers)}
+
+    async def _work(self, user_id):
+        queue = self._queues[user_id]
+        try:
+            while queue:
+                await self._settle(queue)
+                async with self._slots:
+                    # Everything that arrived while we waited for a slot joins this turn too
+                    batch = [queue.popleft() for _ in range(min(len(queue), self.max_batch))]
+                    await self._handle(user_id, batch)
+        finally:
+            del self._workers[user_id]
+            del self._queues[user_id]
+
+    async def _settle(self, queue):
+        """Wait for the user to stop typing: a quiet ``debounce_seconds``, capped by ``max_delay_seconds``"""
+        if not self.debounce_seconds:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = queue[0][3] + self.max_delay_seconds
+        while len(queue) < self.max_batch:
+            wake = min(queue[-1][3] + self.debounce_seconds, deadline)
+            if loop.time() >= wake:
+                return
+            await asyncio.sleep(wake - loop.time())
+
+    async def _handle(self, user_id, batch):
+        message = "\n".join(text for text, _, _, _ in batch)
+        message_id = batch[-1][1]
+        self._stats["turns"] += 1
+        self._stats["coalesced"] += len(batch) - 1
+        self._in_flight += 1
+        try:
+            result = await self.handler(user_id, message, message_id)
+        except Exception as e:
+            print(f"Background processing for {user_id} failed: {e}")
+            result = {}
+        finally:
+            self._in_flight -= 1
+        for _, _, reply, _ in batch[:-1]:
+            if not reply.done():
+                reply.set_result(None)
+        if not batch[-1][2].done():
+            batch[-1][2].set_result(result)
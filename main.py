@@ -1,23 +1,109 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from pydantic import BaseModel
 from typing import List, Optional
 import asyncio
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from twilio.twiml.messaging_response import MessagingResponse
 from fastapi import Form
 
 app = FastAPI(title="AI Appointment Management System")
 
 # Initialize services
-from google_calander_service import GoogleCalendarService
-from ai_agent import AIAppointmentAgent
-from notification_service import NotificationService
 from scheduler import AppointmentScheduler
+from coordination import SchedulerCoordinator
+from supabase_client import supabase
+from appointment_read_model import AppointmentReadModel, appointment_view, etag_matches
+from async_services import calendar_calls, run_query
+from booking import BookingPipeline, SlotUnavailable
+from config import Config
+from doctor_directory import DoctorDirectory
+from reminders import parse_utc
+from inbound import PerUserDispatcher
+from metrics import REQUEST_LATENCY, finish_request, format_breakdown, render_metrics, start_request, stats_collector
+from http_pools import connection_stats
+from services import registry
 
-calendar_service = GoogleCalendarService()
-ai_agent = AIAppointmentAgent()
-notification_service = NotificationService()
+def create_calendar_service():
+    from google_calander_service import GoogleCalendarService
+    return GoogleCalendarService()
+
+def create_ai_agent():
+    from ai_agent import AIAppointmentAgent
+    return AIAppointmentAgent()
+
+def create_notification_service():
+    from notification_service import NotificationService
+    return NotificationService()
+
+# SDK-backed services are built on first use; warm-up does the first-use work before traffic arrives
+registry.register("calendar", create_calendar_service, warm=lambda service: service.client_pool.discovery_document())
+registry.register("ai_agent", create_ai_agent, warm=lambda agent: agent.client)
+registry.register("notifications", create_notification_service, warm=lambda service: service.twilio_client)
+
+calendar_service = registry.proxy("calendar")
+ai_agent = registry.proxy("ai_agent")
+notification_service = registry.proxy("notifications")
+doctor_directory = DoctorDirectory(ttl_seconds=Config.DOCTOR_DIRECTORY_TTL_SECONDS)
+booking_pipeline = BookingPipeline(calendar_service, notification_service, doctor_directory)
+appointment_read_model = AppointmentReadModel(ttl_seconds=Config.APPOINTMENT_CACHE_TTL_SECONDS,
+                                              max_entries=Config.APPOINTMENT_CACHE_MAX_ENTRIES)
+scheduler = AppointmentScheduler(notification_service, coordinator=SchedulerCoordinator())
+
+for name, stats in [("freebusy_cache", registry.stats_of("calendar", "freebusy_cache")),
+                    ("calendar_clients", registry.stats_of("calendar", "client_pool")),
+                    ("response_cache", registry.stats_of("ai_agent", "response_cache")),
+                    ("fast_path", registry.stats_of("ai_agent", "fast_path")),
+                    ("prompt", registry.stats_of("ai_agent", "prompt_builder")),
+                    ("outbox", registry.stats_of("notifications", "outbox")),
+                    ("reminders", scheduler.reminders.stats),
+                    ("scheduler", scheduler.coordinator.stats),
+                    ("services", registry.stats),
+                    ("http", connection_stats.stats)]:
+    stats_collector.register(name, stats)
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    token, breakdown = start_request()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        finish_request(token)
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_LATENCY.labels(request.method, route, str(status)).observe(elapsed)
+        if elapsed >= Config.SLOW_REQUEST_SECONDS:
+            print(f"Slow request {request.method} {route}: {elapsed * 1000:.0f}ms ({format_breakdown(breakdown) or 'no external calls'})")
+
+@app.on_event("startup")
+async def start_services():
+    global warm_up_task
+    notification_service.start()
+    if Config.RUN_SCHEDULER:
+        scheduler.start()
+    if Config.WARM_UP_SERVICES:
+        # In the background, so the worker accepts requests while clients are being built
+        names = None if Config.WARM_UP_SERVICES == ["all"] else Config.WARM_UP_SERVICES
+        warm_up_task = asyncio.create_task(registry.warm_up(names))
+
+@app.on_event("shutdown")
+async def stop_services():
+    if warm_up_task:
+        await warm_up_task
+    await inbound_dispatcher.drain()
+    if Config.RUN_SCHEDULER:
+        await scheduler.stop()
+    await notification_service.stop()
+
+warm_up_task = None
+
+NO_APPOINTMENT_TO_CONFIRM = "I couldn't find an upcoming appointment to confirm. Would you like to book one?"
+INBOUND_BUSY = "We're receiving a lot of messages right now. Please send your message again in a minute."
 
 # Pydantic models
 class PatientCreate(BaseModel):
@@ -40,71 +126,46 @@ class ChatMessage(BaseModel):
 
 @app.post("/api/chat")
 async def chat_with_ai(chat_data: ChatMessage):
-    # Fetch doctors
-    doctors_response = supabase.table("doctors").select("*").execute()
-    doctors = doctors_response.data
+    doctors = await doctor_directory.get_doctors()
 
-    ai_response = ai_agent.process_message(chat_data.user_id, chat_data.message, doctors)
+    ai_response = await ai_agent.process_message(chat_data.user_id, chat_data.message, doctors,
+                                                 roster_version=doctor_directory.version)
 
     if ai_response.get('action_needed') == 'get_availability':
-        context = ai_agent.conversation_context.get(chat_data.user_id, {})
+        context = await ai_agent.get_context(chat_data.user_id)
         collected_info = context.get('collected_info', {})
         if 'doctor_name' in collected_info:
-            doctor_response = supabase.table("doctors").select("*").ilike("name", f"%{collected_info['doctor_name']}%").limit(1).execute()
-            if doctor_response.data:
-                doctor = doctor_response.data[0]
+            doctor = await doctor_directory.find_by_name(collected_info['doctor_name'])
+            if doctor:
                 start_date = datetime.utcnow()
                 end_date = start_date + timedelta(days=14)
-                available_slots = calendar_service.get_available_slots(doctor, start_date, end_date)
-                slot_options = [{"datetime": s.isoformat(), "display": s.strftime("%A, %B %d at %I:%M %p")} for s in available_slots[:10]]
+                slot_options = await booking_pipeline.offer(chat_data.user_id, doctor, start_date, end_date, limit=10,
+                                                            previous_offer=context.get('offered_slots'))
                 ai_response['available_slots'] = slot_options
+                await ai_agent.remember_offered_slots(chat_data.user_id, slot_options)
+
+    elif ai_response.get('action_needed') == 'confirm_appointment':
+        context = await ai_agent.get_context(chat_data.user_id)
+        if await confirm_upcoming_appointment(context['collected_info'].get('phone') or chat_data.user_id) is None:
+            ai_response['message'] = NO_APPOINTMENT_TO_CONFIRM
 
     elif ai_response.get('action_needed') == 'book_appointment':
-        context = ai_agent.conversation_context.get(chat_data.user_id, {})
+        context = await ai_agent.get_context(chat_data.user_id)
         collected_info = context.get('collected_info', {})
         try:
-            # Create or get patient
-            patient_response = supabase.table("patients").select("*").eq("email", collected_info['email']).single().execute()
-            if patient_response.data:
-                patient = patient_response.data
-            else:
-                new_patient = {
-                    "name": collected_info['name'],
-                    "email": collected_info['email'],
-                    "phone": collected_info['phone'],
-                    "preferred_communication": collected_info.get('preferred_communication', 'sms')
-                }
-                patient_response = supabase.table("patients").insert(new_patient).execute()
-                patient = patient_response.data[0]
-
-            # Get doctor
-            doctor_response = supabase.table("doctors").select("*").ilike("name", f"%{collected_info['doctor_name']}%").limit(1).execute()
-            doctor = doctor_response.data[0]
-
-            appointment_datetime = datetime.fromisoformat(collected_info['selected_slot'])
-
-            event_id = calendar_service.create_appointment(doctor, patient, appointment_datetime, collected_info.get('duration', 30), collected_info.get('reason', ''))
-
-            new_appointment = {
-                "patient_id": patient["id"],
-                "doctor_id": doctor["id"],
-                "google_calendar_event_id": event_id,
-                "scheduled_datetime": appointment_datetime.isoformat(),
-                "appointment_type": collected_info.get('appointment_type', 'consultation'),
-                "reason": collected_info.get('reason', ''),
-                "duration_minutes": collected_info.get('duration', 30),
-                "status": "scheduled"
-            }
-
-            appointment_response = supabase.table("appointments").insert(new_appointment).execute()
-            appointment = appointment_response.data[0]
-
-            await notification_service.send_appointment_confirmation(appointment, patient, doctor)
-
-            ai_agent.clear_context(chat_data.user_id)
+            appointment, patient, doctor = await booking_pipeline.book(
+                chat_data.user_id, collected_info, booking_token=context.get('booking_token'),
+                offered=context.get('offered_slots'))
+            appointment_read_model.invalidate(appointment["id"])
+            scheduler.reminders.schedule(appointment)
+
+            await ai_agent.clear_context(chat_data.user_id)
             ai_response['appointment_id'] = appointment["id"]
             ai_response['booking_success'] = True
 
+        except SlotUnavailable:
+            ai_response['message'] = "Sorry, that time was just taken by another patient. Would you like to see other times?"
+            ai_response['booking_success'] = False
         except Exception as e:
             ai_response['message'] = "I'm sorry, there was an error booking your appointment. Please try again."
             ai_response['booking_success'] = False
@@ -115,7 +176,8 @@ async def chat_with_ai(chat_data: ChatMessage):
 async def whatsapp_handler(
     request: Request,
     From: str = Form(...),
-    Body: str = Form(...)
+    Body: str = Form(...),
+    MessageSid: Optional[str] = Form(None)
 ):
     """
     Handle incoming WhatsApp messages
@@ -123,53 +185,140 @@ async def whatsapp_handler(
     """
     # Extract just the number (remove 'whatsapp:' prefix)
     user_id = From.replace("whatsapp:", "")
-    
-    # Process message with AI agent
-    ai_response = ai_agent.process_message(user_id, Body)
 
-    # Respond via WhatsApp
     response = MessagingResponse()
-    msg = response.message(ai_response.get("message", "Sorry, I couldn't understand that."))
+    # A webhook retry (same MessageSid) is not processed again: it gets the original turn's answer,
+    # which Twilio lost when it timed out; with fast acks that answer already went out through the outbox
+    reply = inbound_dispatcher.original_reply(MessageSid)
+    if reply is None:
+        # Messages sent in quick succession are answered together in one turn
+        reply = inbound_dispatcher.submit(user_id, Body, MessageSid)
+        if reply is None:
+            response.message(INBOUND_BUSY)
+            return twiml(response)
+    if Config.WHATSAPP_FAST_ACK:
+        # Acknowledge right away; the reply goes out through the outbox once the agent is done
+        return twiml(response)
+
+    # Process message with AI agent; only the message that closes a turn carries the reply.
+    # Shielded, so a dropped request does not cancel the reply a retry may still wait for
+    ai_response = await asyncio.shield(reply)
+    if ai_response is not None:
+        response.message(ai_response.get("message", "Sorry, I couldn't understand that."))
 
-    return str(response)
+    return twiml(response)
+
+async def whatsapp_turn(user_id, message):
+    ai_response = await ai_agent.process_message(user_id, message)
+    if ai_response.get('action_needed') == 'confirm_appointment':
+        if await confirm_upcoming_appointment(user_id) is None:
+            ai_response['message'] = NO_APPOINTMENT_TO_CONFIRM
+    return ai_response
+
+async def confirm_upcoming_appointment(phone):
+    """Mark the patient's next scheduled appointment as confirmed (CONFIRM reply to a reminder)"""
+    patients = (await run_query(supabase.table("patients").select("id").eq("phone", phone))).data
+    if not patients:
+        return None
+    response = await run_query(supabase.table("appointments").select("id").in_(
+        "patient_id", [p["id"] for p in patients]
+    ).eq("status", "scheduled").gte(
+        "scheduled_datetime", datetime.utcnow().isoformat()
+    ).order("scheduled_datetime").limit(1))
+    if not response.data:
+        return None
+    appointment_id = response.data[0]["id"]
+    await run_query(supabase.table("appointments").update({"status": "confirmed"}).eq("id", appointment_id))
+    appointment_read_model.invalidate(appointment_id)
+    return appointment_id
+
+async def handle_inbound(user_id, message, message_id):
+    ai_response = await whatsapp_turn(user_id, message)
+    if Config.WHATSAPP_FAST_ACK:
+        await notification_service.send_whatsapp_message(
+            user_id,
+            ai_response.get("message", "Sorry, I couldn't understand that."),
+            idempotency_key=f"reply:{message_id}" if message_id else None
+        )
+    return ai_response
+
+inbound_dispatcher = PerUserDispatcher(
+    handle_inbound,
+    debounce_seconds=Config.INBOUND_DEBOUNCE_SECONDS,
+    max_delay_seconds=Config.INBOUND_MAX_DELAY_SECONDS,
+    max_in_flight=Config.INBOUND_MAX_IN_FLIGHT,
+    max_pending=Config.INBOUND_MAX_PENDING
+)
+stats_collector.register("inbound", inbound_dispatcher.stats)
+
+def twiml(response):
+    return Response(content=str(response), media_type="application/xml")
 
 @app.get("/api/appointments/{appointment_id}")
-async def get_appointment(appointment_id: int):
-    response = supabase.table("appointments").select("*").eq("id", appointment_id).single().execute()
-    appointment = response.data
-    if not appointment:
+async def get_appointment(appointment_id: int, request: Request):
+    record, etag = await appointment_read_model.get(appointment_id)
+    if not record:
         raise HTTPException(status_code=404, detail="Appointment not found")
-    patient = supabase.table("patients").select("name").eq("id", appointment["patient_id"]).single().execute().data
-    doctor = supabase.table("doctors").select("name").eq("id", appointment["doctor_id"]).single().execute().data
-    return {
-        "id": appointment["id"],
-        "patient_name": patient["name"],
-        "doctor_name": doctor["name"],
-        "scheduled_datetime": appointment["scheduled_datetime"],
-        "status": appointment["status"],
-        "reason": appointment["reason"]
-    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(appointment_view(record), headers={"ETag": etag})
 
 @app.post("/api/appointments/{appointment_id}/reschedule")
 async def reschedule_appointment(appointment_id: int, new_datetime: datetime):
-    response = supabase.table("appointments").select("*").eq("id", appointment_id).single().execute()
-    appointment = response.data
-    if not appointment:
+    record, _ = await appointment_read_model.get(appointment_id, fresh=True)
+    if not record:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
     # Update in Google Calendar
     # ... (not implemented here)
 
     # Update in Supabase
-    supabase.table("appointments").update({"scheduled_datetime": new_datetime.isoformat()}).eq("id", appointment_id).execute()
+    # A new time means every reminder is due again
+    changes = {"scheduled_datetime": new_datetime.isoformat(), "reminders_sent": []}
+    response = await run_query(supabase.table("appointments").update(changes).eq("id", appointment_id))
+    appointment_read_model.invalidate(appointment_id)
+    appointment = response.data[0] if response.data else {**record, **changes}
+    scheduler.reminders.schedule(appointment)
 
     # Send confirmation
-    patient = supabase.table("patients").select("*").eq("id", appointment["patient_id"]).single().execute().data
-    doctor = supabase.table("doctors").select("*").eq("id", appointment["doctor_id"]).single().execute().data
+    patient, doctor = record["patient"], record["doctor"]
+    calendar_service.invalidate_availability(doctor)
     await notification_service.send_appointment_confirmation(appointment, patient, doctor)
 
     return {"message": "Appointment rescheduled successfully"}
 
+@app.get("/api/availability/earliest")
+async def earliest_availability(specialty: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                limit: int = Query(10, ge=1, le=50), duration_minutes: int = Query(30, ge=5, le=240)):
+    """The next free slots with any doctor of a specialty"""
+    doctors = await doctor_directory.by_specialty(specialty)
+    if not doctors:
+        raise HTTPException(status_code=404, detail=f"No doctors found for specialty {specialty!r}")
+    # Slot maths and the free/busy cache work in naive UTC, so offsets in the query are converted away
+    start = parse_utc(start) if start else datetime.utcnow()
+    end = parse_utc(end) if end else start + timedelta(days=14)
+    slots = await calendar_calls.run(calendar_service.get_earliest_slots, doctors, start, end,
+                                     limit=limit, duration_minutes=duration_minutes)
+    return {
+        "specialty": specialty,
+        "slots": [{
+            "datetime": slot.isoformat(),
+            "display": slot.strftime("%A, %B %d at %I:%M %p"),
+            "doctor_id": doctor["id"],
+            "doctor_name": doctor["name"]
+        } for slot, doctor in slots]
+    }
+
+@app.post("/api/doctors/refresh")
+async def refresh_doctors():
+    await doctor_directory.refresh()
+    return {"message": "Doctor directory refreshed", "version": doctor_directory.version}
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/auth/google")
 async def google_auth():
     auth_url, flow = calendar_service.get_authorization_url()
@@ -182,6 +331,4 @@ async def google_callback(code: str):
 
 if __name__ == "__main__":
     import uvicorn
-    scheduler = AppointmentScheduler(notification_service)
-    scheduler.start()
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,88 @@
+# metrics.py
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+DEPENDENCY_LATENCY = Histogram(
+    'dependency_call_duration_seconds', 'Latency of calls to external dependencies',
+    ['dependency', 'operation'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DEPENDENCY_ERRORS = Counter(
+    'dependency_call_errors_total', 'Failed calls to external dependencies', ['dependency', 'operation']
+)
+DEPENDENCY_IN_FLIGHT = Gauge(
+    'dependency_calls_in_flight', 'Calls to external dependencies currently running', ['dependency']
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Latency of HTTP requests', ['method', 'route', 'status']
+)
+
+# Per-request {dependency: seconds}; set by the HTTP middleware, filled in by track()
+_request_breakdown = ContextVar('request_breakdown', default=None)
+
+
+@contextmanager
+def track(dependency, operation):
+    """Time one external call and add it to the current request's breakdown"""
+    DEPENDENCY_IN_FLIGHT.labels(dependency).inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DEPENDENCY_ERRORS.labels(dependency, operation).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        DEPENDENCY_IN_FLIGHT.labels(dependency).dec()
+        DEPENDENCY_LATENCY.labels(dependency, operation).observe(elapsed)
+        breakdown = _request_breakdown.get()
+        if breakdown is not None:
+            breakdown[dependency] = breakdown.get(dependency, 0.0) + elapsed
+
+
+def start_request():
+    """Begin collecting a dependency breakdown for the current request"""
+    breakdown = {}
+    return _request_breakdown.set(breakdown), breakdown
+
+
+def finish_request(token):
+    _request_breakdown.reset(token)
+
+
+def format_breakdown(breakdown):
+    return ", ".join(f"{dependency} {seconds * 1000:.0f}ms"
+                     for dependency, seconds in sorted(breakdown.items(), key=lambda item: -item[1]))
+
+
+class StatsCollector:
+    """Exposes the stats() dicts of in-process caches and queues as gauges"""
+
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, name, stats_fn):
+        self._sources[name] = stats_fn
+
+    def collect(self):
+        for name, stats_fn in self._sources.items():
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield GaugeMetricFamily(f"{name}_{key}", f"{name} {key.replace('_', ' ')}", value=value)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render_metrics():
+    """Prometheus text exposition of every registered metric: (body, content type)"""
+    return generate_latest(), CONTENT_TYPE_LATEST
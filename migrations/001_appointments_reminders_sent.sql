@@ -0,0 +1,9 @@
+-- Reminder bookkeeping for reminders.py / scheduler.py.
+-- reminders_sent holds the offsets (hours before the appointment, e.g. [24, 2]) already sent;
+-- a reschedule resets it to [] so the reminders go out again for the new time.
+ALTER TABLE appointments
+    ADD COLUMN IF NOT EXISTS reminders_sent jsonb NOT NULL DEFAULT '[]'::jsonb;
+
+-- The reminder refill scans upcoming remindable appointments by time
+CREATE INDEX IF NOT EXISTS appointments_status_scheduled_datetime
+    ON appointments (status, scheduled_datetime);
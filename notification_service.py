@@ -1,26 +1,51 @@
-from twilio.rest import Client
 from datetime import datetime
+from async_services import DependencyTimeout, twilio_calls
 from config import Config
+from http_pools import pooled_session
+from outbox import Outbox, OutboxStore
 
 class NotificationService:
-    def __init__(self):
-        self.twilio_client = Client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
-        
-    async def send_whatsapp_message(self, to_number: str, message: str):
+    def __init__(self, outbox=None):
+        self._twilio_client = None
+        self.outbox = outbox or Outbox(
+            OutboxStore(Config.OUTBOX_PATH, claim_timeout_seconds=Config.OUTBOX_CLAIM_TIMEOUT_SECONDS),
+            deliver=self._deliver,
+            rate_for_sender=self._rate_for_sender,
+            is_retryable=self._is_retryable,
+            max_attempts=Config.OUTBOX_MAX_ATTEMPTS,
+            backoff_seconds=Config.OUTBOX_BACKOFF_SECONDS,
+            concurrency=Config.TWILIO_MAX_CONCURRENCY
+        )
+
+    @property
+    def twilio_client(self):
+        # The Twilio SDK is imported when the first message is delivered, not when the app starts
+        if self._twilio_client is None:
+            from twilio.http.http_client import TwilioHttpClient
+            from twilio.rest import Client
+            http_client = TwilioHttpClient(timeout=Config.TWILIO_TIMEOUT_SECONDS)
+            http_client.session = pooled_session("twilio")
+            self._twilio_client = Client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN, http_client=http_client)
+        return self._twilio_client
+
+    @twilio_client.setter
+    def twilio_client(self, client):
+        self._twilio_client = client
+
+    def start(self):
+        """Start dispatching queued messages; needs a running event loop"""
+        self.outbox.start()
+
+    async def stop(self):
+        await self.outbox.stop()
+
+    async def send_whatsapp_message(self, to_number: str, message: str, idempotency_key=None):
         """Send WhatsApp message"""
-        try:
-            message = self.twilio_client.messages.create(
-                body=message,
-                from_=f"whatsapp:{Config.TWILIO_WHATSAPP_NUMBER}",
-                to=f"whatsapp:{to_number}"
-            )
-            return message.sid
-        except Exception as e:
-            print(f"WhatsApp sending failed: {e}")
-            return None
+        return await self._send(f"whatsapp:{to_number}", message, f"whatsapp:{Config.TWILIO_WHATSAPP_NUMBER}",
+                                idempotency_key)
 
     async def send_appointment_confirmation(self, appointment, patient, doctor):
-        await self.send_sms_confirmation(appointment, patient, doctor)
+        return await self.send_sms_confirmation(appointment, patient, doctor)
 
     async def send_sms_confirmation(self, appointment, patient, doctor):
         message_body = f"""
@@ -32,48 +57,62 @@ Duration: {appointment['duration_minutes']} minutes
 Need to reschedule? Reply RESCHEDULE
 Questions? Call (555) 123-4567
         """.strip()
-        try:
-            message = self.twilio_client.messages.create(
-                body=message_body,
-                from_=Config.TWILIO_PHONE_NUMBER,
-                to=patient['phone']
-            )
-            return message.sid
-        except Exception as e:
-            print(f"SMS sending failed: {e}")
-            return None
+        return await self._send(patient['phone'], message_body, Config.TWILIO_PHONE_NUMBER,
+                                f"confirmation:{appointment['id']}:{appointment['scheduled_datetime']}")
 
     async def send_reminder(self, appointment, patient, doctor, hours_before):
+        when = "tomorrow" if hours_before == 24 else f"in {hours_before} hours"
         message_body = f"""
-Reminder: You have an appointment tomorrow
+Reminder: You have an appointment {when}
 Doctor: Dr. {doctor['name']}
 Date: {appointment['scheduled_datetime']}
 Time: {appointment['scheduled_datetime']}
 Reply CONFIRM to confirm or RESCHEDULE to change
         """.strip()
-        try:
-            message = self.twilio_client.messages.create(
-                body=message_body,
-                from_=Config.TWILIO_PHONE_NUMBER,
-                to=patient['phone']
-            )
-            return message.sid
-        except Exception as e:
-            print(f"SMS sending failed: {e}")
-            return None
+        return await self._send(patient['phone'], message_body, Config.TWILIO_PHONE_NUMBER,
+                                f"reminder:{appointment['id']}:{appointment['scheduled_datetime']}:{hours_before}")
 
     async def send_form_reminder(self, appointment, patient):
         message_body = """
 Thank you for your visit!
-Please share your feedback: https://forms.google.com/appointment-feedback/ 
+Please share your feedback: https://forms.google.com/appointment-feedback/
+        """
+        return await self._send(patient['phone'], message_body, Config.TWILIO_PHONE_NUMBER,
+                                f"form_reminder:{appointment['id']}")
+
+    async def send_form_link(self, appointment, patient, form_url):
+        message_body = f"""
+Thank you for your recent appointment.
+We'd appreciate your feedback: {form_url}
         """
+        return await self._send(patient['phone'], message_body, Config.TWILIO_PHONE_NUMBER,
+                                f"form:{appointment['id']}")
+
+    async def _send(self, to_number, body, from_number, idempotency_key=None):
+        """Queue a message in the outbox; returns the outbox message id"""
         try:
-            message = self.twilio_client.messages.create(
-                body=message_body,
-                from_=Config.TWILIO_PHONE_NUMBER,
-                to=patient['phone']
-            )
-            return message.sid
+            return await self.outbox.enqueue(to_number, from_number, body, idempotency_key)
         except Exception as e:
-            print(f"SMS sending failed: {e}")
-            return None
\ No newline at end of file
+            print(f"Queueing message to {to_number} failed: {e}")
+            return None
+
+    async def _deliver(self, to_number, from_number, body):
+        message = await twilio_calls.call(
+            "messages.create",
+            self.twilio_client.messages.create,
+            body=body,
+            from_=from_number,
+            to=to_number
+        )
+        return message.sid
+
+    def _rate_for_sender(self, from_number):
+        if from_number.startswith("whatsapp:"):
+            return Config.TWILIO_WHATSAPP_MESSAGES_PER_SECOND
+        return Config.TWILIO_SMS_MESSAGES_PER_SECOND
+
+    def _is_retryable(self, error):
+        from twilio.base.exceptions import TwilioRestException
+        if isinstance(error, TwilioRestException):
+            return error.status == 429 or error.status >= 500
+        return isinstance(error, (DependencyTimeout, ConnectionError, OSError))
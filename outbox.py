@@ -0,0 +1,295 @@
+# outbox.py
+
+import asyncio
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from async_services import outbox_calls
+
+
+class TokenBucket:
+    """Allows ``rate`` sends per second with bursts of up to ``capacity``.
+
+    The bucket's state lives in the outbox database, so every worker sharing
+    the file draws from the same budget instead of each sending at ``rate``.
+    Within a process one waiter polls at a time.
+    """
+
+    def __init__(self, store, key, rate, capacity=None):
+        self.store = store
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                wait = await outbox_calls.run(self.store.take_token, self.key, self.rate, self.capacity)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+
+class OutboxStore:
+    """SQLite table of outbound messages, so pending sends survive a restart.
+
+    Every worker process opens the same file. Claims are made in one write
+    transaction and stamped with the claiming store's owner and time; a
+    ``sending`` row whose claim is older than ``claim_timeout_seconds``
+    belongs to a worker that died mid-send and is claimed again.
+    """
+
+    def __init__(self, path, claim_timeout_seconds=300):
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id TEXT PRIMARY KEY,
+                    idempotency_key TEXT UNIQUE NOT NULL,
+                    to_number TEXT NOT NULL,
+                    from_number TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    sid TEXT,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    claimed_by TEXT,
+                    claimed_at REAL
+                )
+            """)
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(outbox)")}
+            for column, kind in (("claimed_by", "TEXT"), ("claimed_at", "REAL")):
+                if column not in columns:
+                    self._connection.execute(f"ALTER TABLE outbox ADD COLUMN {column} {kind}")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS send_tokens (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def insert(self, idempotency_key, to_number, from_number, body):
+        """Insert a message unless its key exists; returns (id, created)"""
+        now = time.time()
+        message_id = uuid.uuid4().hex
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO outbox (id, idempotency_key, to_number, from_number, body, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (message_id, idempotency_key, to_number, from_number, body, now, now))
+            if cursor.rowcount:
+                return message_id, True
+            row = self._connection.execute(
+                "SELECT id FROM outbox WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            return row[0], False
+
+    def claim_due(self, limit):
+        """Claim up to ``limit`` due (or abandoned) messages for this store and return them"""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so no other process can claim the same rows in between
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._connection.execute(
+                    "SELECT id, to_number, from_number, body, attempts FROM outbox "
+                    "WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND claimed_at < ?) "
+                    "ORDER BY next_attempt_at LIMIT ?",
+                    (now, now - self.claim_timeout_seconds, limit)).fetchall()
+                self._connection.executemany(
+                    "UPDATE outbox SET status = 'sending', claimed_by = ?, claimed_at = ? WHERE id = ?",
+                    [(self.owner, now, row[0]) for row in rows])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return [dict(zip(("id", "to_number", "from_number", "body", "attempts"), row)) for row in rows]
+
+    def take_token(self, key, rate, capacity):
+        """Take a send token from the shared bucket ``key``; returns 0, or the seconds until one is available"""
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT tokens, updated FROM send_tokens WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if not wait:
+                    tokens -= 1
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO send_tokens (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return wait
+
+    def release_claims(self):
+        """Hand back messages this store claimed but never sent, e.g. on shutdown"""
+        self._update("UPDATE outbox SET status = 'pending', claimed_by = NULL, claimed_at = NULL "
+                     "WHERE status = 'sending' AND claimed_by = ?", (self.owner,))
+
+    def next_due_at(self):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MIN(CASE WHEN status = 'pending' THEN next_attempt_at ELSE claimed_at + ? END) "
+                "FROM outbox WHERE status IN ('pending', 'sending')", (self.claim_timeout_seconds,)).fetchone()
+        return row[0]
+
+    # Updates only apply while we still hold the claim, so a worker whose claim was taken over cannot undo the new owner's state
+    def mark_sent(self, message_id, sid):
+        self._update("UPDATE outbox SET status = 'sent', sid = ?, attempts = attempts + 1 WHERE id = ? AND claimed_by = ?",
+                     (sid, message_id, self.owner))
+
+    def mark_retry(self, message_id, next_attempt_at, error):
+        self._update("UPDATE outbox SET status = 'pending', attempts = attempts + 1, next_attempt_at = ?, "
+                     "last_error = ?, claimed_by = NULL, claimed_at = NULL WHERE id = ? AND claimed_by = ?",
+                     (next_attempt_at, error, message_id, self.owner))
+
+    def mark_failed(self, message_id, error):
+        self._update("UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ? "
+                     "WHERE id = ? AND claimed_by = ?", (error, message_id, self.owner))
+
+    def prune(self, older_than_seconds):
+        """Delete sent and failed messages older than the cutoff, which also expires their keys"""
+        self._update("DELETE FROM outbox WHERE status IN ('sent', 'failed') AND created_at < ?",
+                     (time.time() - older_than_seconds,))
+
+    def counts(self):
+        with self._lock:
+            return dict(self._connection.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def _update(self, sql, params):
+        with self._lock:
+            self._connection.execute(sql, params)
+
+
+class Outbox:
+    """Persistent, rate-limited outbound message queue.
+
+    ``enqueue`` stores a message under an idempotency key and returns at once;
+    the dispatcher task sends due messages through ``deliver`` while holding a
+    token from the sender number's bucket, retrying retryable failures with
+    exponential backoff and jitter. Store calls run on the ``outbox_calls``
+    threads, so a busy database never blocks the event loop.
+    """
+
+    def __init__(self, store, deliver, rate_for_sender, is_retryable=lambda error: True,
+                 max_attempts=5, backoff_seconds=2.0, max_backoff_seconds=300.0, concurrency=8,
+                 retention_seconds=7 * 86400):
+        self.store = store
+        self.deliver = deliver
+        self.rate_for_sender = rate_for_sender
+        self.is_retryable = is_retryable
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.concurrency = concurrency
+        self.retention_seconds = retention_seconds
+        self._buckets = {}
+        self._wakeup = None
+        self._task = None
+        self._in_flight = set()
+
+    async def enqueue(self, to_number, from_number, body, idempotency_key=None):
+        """Queue a message; a repeated idempotency key returns the original message id"""
+        message_id, _ = await outbox_calls.run(
+            self.store.insert, idempotency_key or uuid.uuid4().hex, to_number, from_number, body)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return message_id
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        await outbox_calls.run(self.store.release_claims)
+
+    def stats(self):
+        counts = self.store.counts()
+        counts["in_flight"] = len(self._in_flight)
+        return counts
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_prune = 0.0
+        failures = 0
+        while True:
+            self._wakeup.clear()
+            try:
+                for message in await outbox_calls.run(self.store.claim_due, self.concurrency * 4):
+                    await semaphore.acquire()
+                    task = asyncio.create_task(self._send(message))
+                    self._in_flight.add(task)
+                    task.add_done_callback(lambda t: (self._in_flight.discard(t), semaphore.release()))
+
+                if time.monotonic() - last_prune > 3600:
+                    await outbox_calls.run(self.store.prune, self.retention_seconds)
+                    last_prune = time.monotonic()
+
+                next_due = await outbox_calls.run(self.store.next_due_at)
+                failures = 0
+            except Exception as e:
+                # Usually "database is locked" while other workers write; the dispatcher must outlive it
+                failures += 1
+                delay = min(30.0, 0.5 * 2 ** (failures - 1)) * random.uniform(0.5, 1.0)
+                print(f"Outbox dispatch failed ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            timeout = 60.0 if next_due is None else max(0.0, next_due - time.time())
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(0)
+
+    async def _send(self, message):
+        await self._bucket(message["from_number"]).acquire()
+        try:
+            sid = await self.deliver(message["to_number"], message["from_number"], message["body"])
+        except Exception as e:
+            attempts = message["attempts"] + 1
+            if attempts < self.max_attempts and self.is_retryable(e):
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+                await self._record(self.store.mark_retry, message, time.time() + delay * random.uniform(0.5, 1.0),
+                                   str(e))
+                self._wakeup.set()
+            else:
+                await self._record(self.store.mark_failed, message, str(e))
+                print(f"Outbox message {message['id']} to {message['to_number']} failed: {e}")
+            return
+        await self._record(self.store.mark_sent, message, sid)
+
+    async def _record(self, mark, message, *args):
+        try:
+            await outbox_calls.run(mark, message["id"], *args)
+        except Exception as e:
+            # The claim stays in place and goes stale, so the message is retried rather than lost
+            print(f"Outbox could not record the result for message {message['id']}: {e}")
+
+    def _bucket(self, from_number):
+        if from_number not in self._buckets:
+            self._buckets[from_number] = TokenBucket(self.store, from_number, self.rate_for_sender(from_number))
+        return self._buckets[from_number]
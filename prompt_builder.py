@@ -0,0 +1,88 @@
+# prompt_builder.py
+
+import json
+import threading
+
+# Identical on every call and always sent first, so provider-side prefix caching can reuse it
+STATIC_SYSTEM_PROMPT = """You are a helpful AI assistant for a medical clinic. Your job is to help patients book appointments.
+Conversation stages:
+1. greeting - Welcome and understand what they need
+2. doctor_selection - Help them choose appropriate doctor
+3. info_collection - Collect patient information (name, email, phone, reason)
+4. scheduling - Show available slots and book appointment
+5. confirmation - Confirm details and provide next steps
+Guidelines:
+- Be friendly and professional
+- Ask for one piece of information at a time
+- Validate email and phone formats
+- Suggest appointment slots clearly
+- Always confirm details before booking
+Respond in JSON format:
+{"message": "Your response to the patient", "next_stage": "next_conversation_stage", "extracted_info": {"key": "value"}, "action_needed": "book_appointment|get_availability|none"}"""
+
+# Long free-text answers (e.g. the visit reason) are clipped in the per-turn state
+MAX_STATE_VALUE_LENGTH = 120
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for prompts we have not sent yet"""
+    return (len(text) + 3) // 4
+
+
+class PromptBuilder:
+    """Builds the Groq messages for a turn from cached parts.
+
+    The doctor roster is rendered once per directory version; only the small
+    per-user state line is built on every call.
+    """
+
+    def __init__(self):
+        self._roster_key = None
+        self._roster_text = "Doctors: none listed"
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "last_prompt_tokens": 0}
+
+    def build_messages(self, context, message, doctors=None, roster_version=None):
+        dynamic = f"{self.roster(doctors, roster_version)}\n{self.state(context)}"
+        return [
+            {"role": "system", "content": STATIC_SYSTEM_PROMPT},
+            {"role": "system", "content": dynamic},
+            {"role": "user", "content": message}
+        ]
+
+    def roster(self, doctors, version=None):
+        if not doctors:
+            return "Doctors: none listed"
+        key = version if version is not None else tuple((d.get('name'), d.get('specialty')) for d in doctors)
+        if key != self._roster_key:
+            lines = [f"{d.get('name')} ({d.get('specialty') or 'general'})" for d in doctors]
+            self._roster_text = "Doctors: " + "; ".join(lines)
+            self._roster_key = key
+        return self._roster_text
+
+    def state(self, context):
+        collected = {
+            key: value[:MAX_STATE_VALUE_LENGTH] if isinstance(value, str) else value
+            for key, value in context.get('collected_info', {}).items()
+            if value not in (None, '', [], {})
+        }
+        return f"Stage: {context['stage']}\nCollected: {json.dumps(collected, separators=(',', ':'))}"
+
+    def record_usage(self, messages, usage=None):
+        """Record prompt size for one call; uses the provider's counts when the response has them"""
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        if prompt_tokens is None:
+            prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["completion_tokens"] += completion_tokens
+            self._stats["last_prompt_tokens"] = prompt_tokens
+        return prompt_tokens
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_prompt_tokens"] = stats["prompt_tokens"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
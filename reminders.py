@@ -0,0 +1,145 @@
+# reminders.py
+
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+from async_services import run_query
+from supabase_client import supabase
+
+# Rows per query when loading appointments that entered the horizon
+PAGE_SIZE = 500
+
+# A patient who replies CONFIRM moves the appointment to 'confirmed'; its later reminders still go out
+REMINDABLE_STATUSES = ('scheduled', 'confirmed')
+
+
+def parse_utc(value):
+    """Naive UTC datetime from a stored timestamp; naive values are taken to be UTC already"""
+    moment = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+class ReminderQueue:
+    """Reminders ordered by due time: a heap of (due_at, appointment id, hours_before).
+
+    Appointments are loaded once, as they come within the horizon (the
+    largest offset plus ``lookahead_seconds``), by scanning forward from a
+    ``scheduled_datetime`` watermark; bookings and reschedules call
+    ``schedule`` directly. A booking or reschedule handled by another worker
+    never reaches this queue that way, so every ``rescan_seconds`` a refill
+    re-reads the whole loaded horizon instead of only the new part; rows
+    already queued for the same time are skipped. Queued entries remember the appointment time they
+    were built for, so a reschedule simply orphans them. Offsets already sent
+    are read from the row's ``reminders_sent`` column and skipped. Only
+    appointments for which ``accepts(id)`` is true are queued and sent.
+    """
+
+    def __init__(self, offsets_hours, lookahead_seconds=900, grace_seconds=1800, rescan_seconds=300, accepts=None):
+        self.offsets_hours = sorted(set(offsets_hours), reverse=True)
+        self.lookahead = timedelta(seconds=lookahead_seconds)
+        # Reminders found overdue by more than this (e.g. after downtime) are dropped, not sent late
+        self.grace = timedelta(seconds=grace_seconds)
+        self.accepts = accepts or (lambda appointment_id: True)
+        self.rescan = timedelta(seconds=rescan_seconds)
+        self.watermark = None
+        self._next_rescan = None
+        self.changed = asyncio.Event()
+        self._heap = []
+        self._versions = {}
+
+    @property
+    def horizon(self):
+        return timedelta(hours=self.offsets_hours[0]) + self.lookahead
+
+    def schedule(self, appointment, now=None):
+        """Queue the appointment's unsent reminders, replacing any queued for another time"""
+        now = now or datetime.utcnow()
+        scheduled = parse_utc(appointment['scheduled_datetime'])
+        if self._versions.get(appointment['id']) == scheduled:
+            return 0
+        self._versions.pop(appointment['id'], None)
+        # Beyond the watermark the next refill picks it up; before start() nothing is queued
+        if self.watermark is None or scheduled > self.watermark or not self.accepts(appointment['id']):
+            return 0
+        if appointment.get('status', 'scheduled') not in REMINDABLE_STATUSES or scheduled <= now:
+            return 0
+
+        sent = set(appointment.get('reminders_sent') or [])
+        queued = 0
+        for hours in self.offsets_hours:
+            due_at = scheduled - timedelta(hours=hours)
+            if hours in sent or due_at < now - self.grace:
+                continue
+            heapq.heappush(self._heap, (due_at, appointment['id'], hours, scheduled))
+            queued += 1
+        if queued:
+            self._versions[appointment['id']] = scheduled
+            self.changed.set()
+        return queued
+
+    async def refill(self, now=None):
+        """Load the appointments that entered the horizon since the last refill (or all of it, when a re-scan is due)"""
+        now = now or datetime.utcnow()
+        if self.watermark is None or now >= self._next_rescan:
+            start = now
+            self._next_rescan = now + self.rescan
+        else:
+            start = self.watermark
+        end = now + self.horizon
+        if end <= start:
+            return 0
+        rows = []
+        while True:
+            response = await run_query(supabase.table("appointments").select(
+                "id, scheduled_datetime, status, reminders_sent"
+            ).in_("status", list(REMINDABLE_STATUSES)).gt(
+                "scheduled_datetime", start.isoformat()
+            ).lte(
+                "scheduled_datetime", end.isoformat()
+            ).order("scheduled_datetime").order("id").range(len(rows), len(rows) + PAGE_SIZE - 1))
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+
+        self.watermark = end
+        self._versions = {key: value for key, value in self._versions.items() if value > now}
+        return sum(self.schedule(row, now) for row in rows)
+
+    def reload(self):
+        """Reload the whole horizon on the next refill, e.g. after ``accepts`` starts taking more ids"""
+        # Forget appointments we stopped accepting, so the refill queues them afresh once we accept them again
+        self._heap = [entry for entry in self._heap if self.accepts(entry[1])]
+        heapq.heapify(self._heap)
+        self._versions = {key: value for key, value in self._versions.items() if self.accepts(key)}
+        self.watermark = None
+        self.changed.set()
+
+    def pop_due(self, now=None):
+        """Remove and return (appointment id, hours_before, scheduled) for every reminder now due"""
+        now = now or datetime.utcnow()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, appointment_id, hours, scheduled = heapq.heappop(self._heap)
+            if self._versions.get(appointment_id) != scheduled:
+                continue
+            if self.accepts(appointment_id):
+                due.append((appointment_id, hours, scheduled))
+            else:
+                # Not ours right now; if the shard comes back, the reload must be able to queue it again
+                del self._versions[appointment_id]
+        return due
+
+    def seconds_until_next(self, now=None):
+        if not self._heap:
+            return None
+        return max(0.0, (self._heap[0][0] - (now or datetime.utcnow())).total_seconds())
+
+    def stats(self):
+        return {
+            "queued": len(self._heap),
+            "appointments": len(self._versions),
+            "watermark_ahead_seconds": (self.watermark - datetime.utcnow()).total_seconds() if self.watermark else 0.0
+        }
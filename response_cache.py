@@ -0,0 +1,82 @@
+# response_cache.py
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Anything that looks like an email address, phone number, date or id keeps the turn out of the cache
+_PII_RE = re.compile(r'@|\d')
+
+
+def normalize_message(text):
+    """'  Hi!!  I need an Appointment. ' -> 'hi i need an appointment'"""
+    return ' '.join(re.findall(r"[a-z']+", text.lower()))
+
+
+class ResponseCache:
+    """LRU + TTL cache of agent responses for repeated, PII-free turns.
+
+    Keys combine the conversation stage, the normalized message and a hash
+    of the collected info and the rendered doctor roster, so a cached answer
+    is only reused when the LLM would have seen the same prompt, and the
+    patient details never sit in the key itself.
+    """
+
+    def __init__(self, max_entries=2000, ttl_seconds=900):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def key(self, context, message, roster_text):
+        """Cache key for a turn, or None when the message may carry PII"""
+        if _PII_RE.search(message):
+            with self._lock:
+                self.skipped += 1
+            return None
+        normalized = normalize_message(message)
+        if not normalized:
+            return None
+        prompt_state = json.dumps([context.get('collected_info', {}), roster_text], sort_keys=True,
+                                  separators=(',', ':'))
+        return (context['stage'], normalized, hashlib.sha1(prompt_state.encode()).hexdigest())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[0])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        """Store a response unless the model extracted information from the turn"""
+        if response.get('extracted_info') or response.get('action_needed', 'none') != 'none':
+            return
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(response), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_pii": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -1,62 +1,247 @@
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
 import asyncio
+import time
+from async_services import run_query
+from config import Config
+from reminders import REMINDABLE_STATUSES, ReminderQueue, parse_utc
+from supabase_client import supabase
+
+# Keeps `in.(...)` filters well under PostgREST's URL length limits
+ID_CHUNK_SIZE = 200
+
+
+def _chunks(ids):
+    for offset in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[offset:offset + ID_CHUNK_SIZE]
+
+
+class JobRunSummary:
+    """Outcome of one scheduler job run"""
+
+    def __init__(self, job):
+        self.job = job
+        self.total = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self._started = time.perf_counter()
+        self.duration_seconds = 0.0
+
+    def finish(self):
+        self.duration_seconds = time.perf_counter() - self._started
+        return self
+
+    def as_dict(self):
+        return {
+            "job": self.job,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "messages_per_second": round(self.sent / self.duration_seconds, 2) if self.duration_seconds else 0.0
+        }
+
+    def __str__(self):
+        stats = self.as_dict()
+        return (f"{stats['job']}: {stats['sent']}/{stats['total']} sent, {stats['failed']} failed, "
+                f"{stats['skipped']} skipped in {stats['duration_seconds']}s ({stats['messages_per_second']} msg/s)")
+
 
 class AppointmentScheduler:
-    def __init__(self, notification_service):
-        self.scheduler = AsyncIOScheduler()
+    """Reminder and feedback-form jobs.
+
+    With a ``coordinator`` (see coordination.py) every worker can run the
+    scheduler: each one only handles appointments in the shards it holds a
+    lease on. Without one it handles every appointment.
+    """
+
+    def __init__(self, notification_service, send_concurrency=None, reminder_offsets_hours=None, coordinator=None):
+        self.scheduler = None
         self.notification_service = notification_service
+        self.send_concurrency = send_concurrency or Config.SCHEDULER_SEND_CONCURRENCY
+        self.coordinator = coordinator
+        self.reminders = ReminderQueue(
+            reminder_offsets_hours or Config.REMINDER_OFFSETS_HOURS,
+            lookahead_seconds=Config.REMINDER_LOOKAHEAD_SECONDS,
+            grace_seconds=Config.REMINDER_GRACE_SECONDS,
+            rescan_seconds=Config.REMINDER_RESCAN_SECONDS,
+            accepts=coordinator.owns if coordinator else None
+        )
+        self._reminder_task = None
 
     def start(self):
-        self.scheduler.add_job(self.send_reminders, CronTrigger(minute=0), id='send_reminders')
-        self.scheduler.add_job(self.send_post_appointment_forms, CronTrigger(minute='*/30'), id='send_forms')
+        """Start the jobs; needs a running event loop"""
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        from apscheduler.triggers.cron import CronTrigger
+
+        self.scheduler = AsyncIOScheduler()
+        # A slow run is never overlapped by the next trigger; missed triggers collapse into one run
+        self.scheduler.add_job(self.send_post_appointment_forms, CronTrigger(minute='*/30'), id='send_forms',
+                               max_instances=1, coalesce=True)
         self.scheduler.start()
+        if self.coordinator:
+            self.coordinator.on_change = self._shards_changed
+            self.coordinator.start()
+        self._reminder_task = asyncio.get_running_loop().create_task(self.run_reminders())
+
+    async def stop(self):
+        if self.coordinator:
+            await self.coordinator.stop()
+        if self._reminder_task:
+            self._reminder_task.cancel()
+            await asyncio.gather(self._reminder_task, return_exceptions=True)
+            self._reminder_task = None
+        if self.scheduler:
+            self.scheduler.shutdown(wait=False)
+
+    async def run_reminders(self):
+        """Sleep until the next reminder is due or the horizon needs extending, then send what is due"""
+        next_refill = 0.0
+        while True:
+            try:
+                if self.coordinator and not self.coordinator.shards:
+                    # Nothing to send until a shard lease comes our way; _shards_changed wakes us
+                    next_refill = time.monotonic() + Config.REMINDER_REFILL_SECONDS
+                elif time.monotonic() >= next_refill or self.reminders.watermark is None:
+                    await self.reminders.refill()
+                    next_refill = time.monotonic() + Config.REMINDER_REFILL_SECONDS
+                await self.send_reminders()
+            except Exception as e:
+                print(f"Reminder run failed: {e}")
+                next_refill = min(next_refill, time.monotonic() + 30)
+            wait = next_refill - time.monotonic()
+            until_due = self.reminders.seconds_until_next()
+            if until_due is not None:
+                wait = min(wait, until_due)
+            self.reminders.changed.clear()
+            try:
+                await asyncio.wait_for(self.reminders.changed.wait(), timeout=max(wait, 0.0))
+            except asyncio.TimeoutError:
+                pass
 
     async def send_reminders(self):
-        now = datetime.utcnow()
-        tomorrow = now + timedelta(hours=24)
+        """Send every queued reminder whose due time has come and record it as sent"""
+        summary = JobRunSummary("send_reminders")
+        due = self.reminders.pop_due()
+        if not due:
+            return summary.finish()
+        summary.total = len(due)
+
+        # Re-read the rows: another worker may have cancelled, moved or already reminded them
+        current = await self._fetch_by_id("appointments", {appointment_id for appointment_id, _, _ in due})
+        reminders = []
+        for appointment_id, hours, scheduled in due:
+            appointment = current.get(appointment_id)
+            if (appointment is None or appointment["status"] not in REMINDABLE_STATUSES
+                    or parse_utc(appointment["scheduled_datetime"]) != scheduled
+                    or hours in (appointment.get("reminders_sent") or [])):
+                summary.skipped += 1
+                continue
+            reminders.append((appointment, hours))
+        appointments = [appointment for appointment, _ in reminders]
+
+        patients, doctors = await asyncio.gather(
+            self._fetch_by_id("patients", {a["patient_id"] for a in appointments}),
+            self._fetch_by_id("doctors", {a["doctor_id"] for a in appointments})
+        )
+
+        sent = {}
+
+        async def send(reminder):
+            appointment, hours = reminder
+            patient = patients.get(appointment["patient_id"])
+            doctor = doctors.get(appointment["doctor_id"])
+            if patient is None or doctor is None:
+                summary.skipped += 1
+                return
+            # The outbox dedups on appointment, time and offset, so a crash before the row update cannot double-send
+            if await self.notification_service.send_reminder(appointment, patient, doctor, hours):
+                sent.setdefault(appointment["id"], list(appointment.get("reminders_sent") or [])).append(hours)
+                summary.sent += 1
+            else:
+                summary.failed += 1
+
+        await self._run_bounded(send, reminders, summary)
+        await self._mark_reminders_sent(sent)
+        print(summary.finish())
+        return summary
 
-        # Get appointments from Supabase
-        response = supabase.table("appointments").select("*").filter(
-            "scheduled_datetime", "between", [tomorrow - timedelta(minutes=30), tomorrow + timedelta(minutes=30)]
-        ).filter("status", "eq", "scheduled").execute()
-        appointments = response.data
+    def _shards_changed(self, gained, lost):
+        # Reminders of lost shards are dropped as they come due; gained shards need their horizon loaded
+        if gained:
+            self.reminders.reload()
 
-        for appointment in appointments:
-            patient = supabase.table("patients").select("*").eq("id", appointment["patient_id"]).single().execute().data
-            doctor = supabase.table("doctors").select("*").eq("id", appointment["doctor_id"]).single().execute().data
-            await self.notification_service.send_reminder(appointment, patient, doctor, 24)
+    def _owns(self, appointment):
+        return self.coordinator is None or self.coordinator.owns(appointment["id"])
 
     async def send_post_appointment_forms(self):
+        summary = JobRunSummary("send_forms")
+        if self.coordinator and not self.coordinator.shards:
+            return summary.finish()
         cutoff_time = datetime.utcnow() - timedelta(hours=2)
-        response = supabase.table("appointments").select("*").filter(
+        response = await run_query(supabase.table("appointments").select("*").filter(
             "status", "eq", "completed"
         ).filter("form_sent", "eq", False).filter(
             "scheduled_datetime", "gte", cutoff_time.isoformat()
-        ).execute()
-        appointments = response.data
+        ))
+        appointments = [appointment for appointment in response.data or [] if self._owns(appointment)]
+        summary.total = len(appointments)
 
-        for appointment in appointments:
-            patient = supabase.table("patients").select("*").eq("id", appointment["patient_id"]).single().execute().data
+        patients = await self._fetch_by_id("patients", {a["patient_id"] for a in appointments})
+        sent_ids = []
+
+        async def send(appointment):
+            patient = patients.get(appointment["patient_id"])
             form_url = await self.create_post_appointment_form(appointment)
-            if form_url:
-                await self.send_form_to_patient(appointment, patient, form_url)
-                supabase.table("appointments").update({"form_sent": True}).eq("id", appointment["id"]).execute()
+            if patient is None or not form_url:
+                summary.skipped += 1
+                return
+            if await self.send_form_to_patient(appointment, patient, form_url):
+                sent_ids.append(appointment["id"])
+                summary.sent += 1
+            else:
+                summary.failed += 1
+
+        await self._run_bounded(send, appointments, summary)
+        for chunk in _chunks(sent_ids):
+            await run_query(supabase.table("appointments").update({"form_sent": True}).in_("id", chunk))
+        print(summary.finish())
+        return summary
 
     async def create_post_appointment_form(self, appointment):
-        return f"https://forms.google.com/appointment-feedback/{appointment['id']}" 
+        return f"https://forms.google.com/appointment-feedback/{appointment['id']}"
 
     async def send_form_to_patient(self, appointment, patient, form_url):
-        message_body = f"""
-Thank you for your recent appointment.
-We'd appreciate your feedback: {form_url}
-        """
-        try:
-            self.twilio_client.messages.create(
-                body=message_body,
-                from_=Config.TWILIO_PHONE_NUMBER,
-                to=patient['phone']
-            )
-        except Exception as e:
-            print(f"Form SMS failed: {e}")
\ No newline at end of file
+        return await self.notification_service.send_form_link(appointment, patient, form_url)
+
+    async def _mark_reminders_sent(self, sent):
+        """Persist reminders_sent, one update per distinct new value"""
+        by_value = {}
+        for appointment_id, offsets in sent.items():
+            by_value.setdefault(tuple(sorted(offsets)), []).append(appointment_id)
+        for offsets, ids in by_value.items():
+            for chunk in _chunks(ids):
+                await run_query(supabase.table("appointments").update({"reminders_sent": list(offsets)}).in_("id", chunk))
+
+    async def _fetch_by_id(self, table, ids):
+        """Load many rows of a table keyed by id, a few hundred ids per query"""
+        ids = list(ids)
+        responses = await asyncio.gather(*(
+            run_query(supabase.table(table).select("*").in_("id", chunk)) for chunk in _chunks(ids)
+        ))
+        return {row["id"]: row for response in responses for row in response.data or []}
+
+    async def _run_bounded(self, fn, items, summary):
+        semaphore = asyncio.Semaphore(self.send_concurrency)
+
+        async def run(item):
+            async with semaphore:
+                try:
+                    await fn(item)
+                except Exception as e:
+                    summary.failed += 1
+                    appointment = item[0] if isinstance(item, tuple) else item
+                    print(f"{summary.job} failed for appointment {appointment.get('id')}: {e}")
+
+        await asyncio.gather(*(run(item) for item in items))
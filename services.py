@@ -0,0 +1,96 @@
+# services.py
+
+import asyncio
+import threading
+import time
+
+
+class ServiceRegistry:
+    """Builds shared services on first use.
+
+    Factories import their SDKs themselves, so importing the app does not pay
+    for Groq, Twilio, Supabase or the Google client libraries until a request
+    actually needs them. ``warm_up`` builds chosen services ahead of traffic.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._warmers = {}
+        self._instances = {}
+        self._locks = {}
+        self._build_seconds = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, warm=None):
+        """``warm(service)``, if given, does any extra first-use work during warm-up"""
+        self._factories[name] = factory
+        if warm is not None:
+            self._warmers[name] = warm
+        self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        # Per-service lock: a request and a warm-up thread never build the same service twice
+        with self._locks[name]:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._build_seconds[name] = time.perf_counter() - started
+            return self._instances[name]
+
+    def built(self, name):
+        return name in self._instances
+
+    def proxy(self, name):
+        return LazyService(self, name)
+
+    def stats_of(self, name, attribute):
+        """A stats() source for StatsCollector that reports nothing until the service exists"""
+        def stats():
+            if not self.built(name):
+                return {}
+            return getattr(self.get(name), attribute).stats()
+        return stats
+
+    async def warm_up(self, names=None):
+        """Build (and warm) services in worker threads; returns seconds taken per service"""
+        names = list(self._factories) if names is None else names
+
+        def warm(name):
+            started = time.perf_counter()
+            service = self.get(name)
+            if name in self._warmers:
+                self._warmers[name](service)
+            return time.perf_counter() - started
+
+        timings = await asyncio.gather(*(asyncio.to_thread(warm, name) for name in names), return_exceptions=True)
+        for name, result in zip(names, timings):
+            if isinstance(result, Exception):
+                print(f"Warming up {name} failed: {result}")
+        return {name: result for name, result in zip(names, timings) if not isinstance(result, Exception)}
+
+    def stats(self):
+        return {f"{name}_build_seconds": seconds for name, seconds in self._build_seconds.items()}
+
+
+class LazyService:
+    """Stands in for a registry service and builds it on first attribute access"""
+
+    def __init__(self, registry, name):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._registry.get(self._name), attribute, value)
+
+    def __repr__(self):
+        state = "built" if self._registry.built(self._name) else "not built"
+        return f"<LazyService {self._name} ({state})>"
+
+
+registry = ServiceRegistry()
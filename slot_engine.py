@@ -0,0 +1,138 @@
+# slot_engine.py
+
+import json
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_WORKING_HOURS = {
+    'monday': {'start': '09:00', 'end': '17:00'},
+    'tuesday': {'start': '09:00', 'end': '17:00'},
+    'wednesday': {'start': '09:00', 'end': '17:00'},
+    'thursday': {'start': '09:00', 'end': '17:00'},
+    'friday': {'start': '09:00', 'end': '17:00'}
+}
+
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def load_working_hours(doctor):
+    """Return a doctor's working hours as a dict, falling back to the default week"""
+    raw = doctor.get('working_hours')
+    if isinstance(raw, str):
+        raw = json.loads(raw or '{}')
+    return raw or DEFAULT_WORKING_HOURS
+
+
+def compile_working_hours(working_hours):
+    """Parse HH:MM strings once, indexed by weekday number"""
+    compiled = {}
+    for weekday, day_name in enumerate(DAY_NAMES):
+        day_hours = working_hours.get(day_name)
+        if day_hours:
+            compiled[weekday] = (datetime.strptime(day_hours['start'], '%H:%M').time(),
+                                 datetime.strptime(day_hours['end'], '%H:%M').time())
+    return compiled
+
+
+def _parse_timestamp(value, aware):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if aware and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    if not aware and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_busy_periods(busy_periods, aware=False):
+    """Parse free/busy periods once and return them sorted and merged as (start, end) tuples.
+
+    Timestamps are normalized to UTC; naive output is used when the caller
+    works with naive UTC datetimes (``datetime.utcnow()``).
+    """
+    intervals = sorted(
+        (_parse_timestamp(period['start'], aware), _parse_timestamp(period['end'], aware))
+        for period in busy_periods
+    )
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _working_days(start_date, end_date, compiled_hours):
+    tzinfo = start_date.tzinfo
+    current_date = start_date.date()
+    while current_date <= end_date.date():
+        day_hours = compiled_hours.get(current_date.weekday())
+        if day_hours:
+            yield (current_date,
+                   datetime.combine(current_date, day_hours[0], tzinfo=tzinfo),
+                   datetime.combine(current_date, day_hours[1], tzinfo=tzinfo))
+        current_date += timedelta(days=1)
+
+
+def iter_free_slots(busy, working_hours, start_date, end_date, duration_minutes=30):
+    """Lazily yield free slot start times, walking the merged busy list with a sweep line.
+
+    ``busy`` must come from ``parse_busy_periods``. Slots are laid out on a
+    ``duration_minutes`` grid from the start of each working day, exactly like
+    the original per-slot loop, so callers can stop consuming as soon as they
+    have enough.
+    """
+    step = timedelta(minutes=duration_minutes)
+    compiled_hours = compile_working_hours(working_hours)
+    index = 0
+    count = len(busy)
+
+    for _, day_start, day_end in _working_days(start_date, end_date, compiled_hours):
+        slot = day_start
+        while slot + step <= day_end:
+            slot_end = slot + step
+            while index < count and busy[index][1] <= slot:
+                index += 1
+            if index < count and busy[index][0] < slot_end:
+                # Skip straight to the first grid slot at or after the busy block ends
+                slot += step * -((slot - busy[index][1]) // step)
+                continue
+            yield slot
+            slot = slot_end
+
+
+def build_day_bitmaps(busy, working_hours, start_date, end_date, duration_minutes=30):
+    """Return {date: (day_start, bitmap)} where bit k set means slot k of that day is free"""
+    step = timedelta(minutes=duration_minutes)
+    compiled_hours = compile_working_hours(working_hours)
+    bitmaps = {}
+    index = 0
+    count = len(busy)
+
+    for current_date, day_start, day_end in _working_days(start_date, end_date, compiled_hours):
+        slot_count = max((day_end - day_start) // step, 0)
+        bitmap = (1 << slot_count) - 1
+        while index < count and busy[index][1] <= day_start:
+            index += 1
+        probe = index
+        while probe < count and busy[probe][0] < day_end:
+            busy_start, busy_end = busy[probe]
+            first = max((busy_start - day_start) // step, 0)
+            last = min(-((day_start - busy_end) // step), slot_count)
+            if last > first:
+                bitmap &= ~(((1 << (last - first)) - 1) << first)
+            probe += 1
+        bitmaps[current_date] = (day_start, bitmap)
+    return bitmaps
+
+
+def slots_from_bitmap(day_start, bitmap, duration_minutes=30):
+    """Yield the start times of the free slots encoded in a day bitmap"""
+    step = timedelta(minutes=duration_minutes)
+    position = 0
+    while bitmap:
+        if bitmap & 1:
+            yield day_start + step * position
+        bitmap >>= 1
+        position += 1
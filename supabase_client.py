@@ -1,4 +1,19 @@
-from supabase import create_client, Client
 from config import Config
+from http_pools import pooled_httpx_client
+from services import registry
 
-supabase: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
\ No newline at end of file
+
+def create_supabase_client():
+    from supabase import ClientOptions, create_client
+    try:
+        options = ClientOptions(httpx_client=pooled_httpx_client("supabase"))
+    except TypeError:
+        # supabase-py releases before httpx_client was an option manage their own pool
+        options = ClientOptions()
+    return create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY, options=options)
+
+
+registry.register("supabase", create_supabase_client)
+
+# Created on first query, so importing modules that use it stays cheap
+supabase = registry.proxy("supabase")
\ No newline at end of file